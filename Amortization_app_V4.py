@@ -7,14 +7,13 @@ Created on Wed Sep  6 17:20:25 2023
 
 ""
 # streamlit_app.py
-import io
-import base64
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from mortgagestyle_v2 import MortgageStyle
-from straightline_v2 import StraightLineAmortization
 from SOFRDataExtractor import SOFRDataExtractor  # Assuming the previous code is saved in this file
+from schedule_cache import default_cache, loan_schedule
+from export import available_formats, export_bytes, file_name, mime_type
+from instrumentation import PROFILERS, STAGES, record
 
 import streamlit as st
 
@@ -38,7 +37,7 @@ def homepage():
     st.markdown("""
     - Calculate Mortgage Style, Hybrid Style, and Straight Line Amortizations.
     - Supports both fixed and floating interest rates.
-    - Downloadable amortization schedule in Excel format.
+    - Downloadable amortization schedule in CSV, Parquet, Arrow or Excel format.
     """)
 
     # How to Use
@@ -48,7 +47,7 @@ def homepage():
     2. Choose the type of Amortization: Mortgage Style, Hybrid Style, or Straight Line.
     3. For floating rate, upload the SOFR data file and select the reset frequency.
     4. Click on the "Generate Amortization" button to view the amortization table.
-    5. You can also download the table in Excel format using the provided link.
+    5. You can also download the table in the chosen Download Format using the download button.
     """)
     
     # Details about SOFR_Data file
@@ -72,20 +71,39 @@ def homepage():
     **If you find any errors or have any question please feel free to reach out via LinkedIn:**
         https://www.linkedin.com/in/gil-de-la-cruz-vazquez-62049b125/""")
 
-def apply_floating_rate(df, f, spread):
-    for i in range(len(df)):
-        if i == 0:
-            continue  # No change for the first period
-        df.at[i, 'Period Interest'] = round(df.at[i, 'Outstanding Balance'] * (f(i) + spread) / 12,2)  # Applying spread to the SOFR rate
-        df.at[i, 'Period Payment'] = round(df.at[i, 'Period Interest'] + df.at[i, 'Principal Payment'],2)
-        df.at[i, 'Outstanding Balance'] = df.at[i-1, 'Outstanding Balance'] - df.at[i, 'Principal Payment']
-    return df
-    
-    
+def timing_panel(recorder):
+    report = recorder.report()
+    with st.expander("Timing", expanded=True):
+        st.caption(f"Run took {report['elapsed_s'] * 1000:.1f} ms; stage times include the stages they call")
+        if report["stages"]:
+            st.dataframe(pd.DataFrame(report["stages"]))
+        if report["counters"]:
+            st.json(report["counters"])
+        profile = report["profile"]
+        if profile is not None:
+            if "stats" in profile:
+                st.text(profile["stats"])
+            else:
+                st.json(profile)
+        st.download_button("Download Timing Report (JSON)", recorder.to_json(), file_name="timing_report.json",
+                           mime="application/json")
+
 
 def main():
     st.title("Amortization Calculator")
 
+    # Opt-in: nothing is timed unless the panel is switched on
+    if not st.sidebar.checkbox("Show Timing Panel"):
+        calculator()
+        return
+    profile_stage = st.sidebar.selectbox("Profile Stage", ["None"] + list(STAGES))
+    profiler = st.sidebar.selectbox("Profiler", PROFILERS)
+    with record(None if profile_stage == "None" else profile_stage, profiler) as recorder:
+        calculator()
+    timing_panel(recorder)
+
+
+def calculator():
     # Input parameters
     settlement_date = st.date_input("Settlement Date", datetime(2022, 8, 1))
     maturity_date = st.date_input("Maturity Date", datetime(2032, 8, 1))
@@ -98,6 +116,7 @@ def main():
     amortization_years = st.number_input("Amortization Years", value=25, step=1)
     # Output format selection
     output_format = st.selectbox("Output Format", ["Simple Amortization", "P+I"])
+    download_format = st.selectbox("Download Format", available_formats())
 
     # Choose amortization type
     amortization_type = st.selectbox("Choose Amortization Type", ["Mortgage Style", "Hybrid Style", "Straight Line"])
@@ -111,41 +130,42 @@ def main():
         if sofr_file:
             data_extractor = SOFRDataExtractor(sofr_file)
             months_duration = st.selectbox("Reset Frequency", ["1M", "3M", "6M"])
+            interpolation = st.selectbox("Curve Interpolation", ["Linear", "Flat Forward", "Log-Linear DF"])
+            method = {"Linear": "linear", "Flat Forward": "flat_forward", "Log-Linear DF": "log_linear_df"}[interpolation]
             
             if months_duration == "1M":
-                f = data_extractor.interpolate_curve(data_extractor.data_1m)
+                f = data_extractor.forward_curve(data_extractor.data_1m, method)
             elif months_duration == "3M":
-                f = data_extractor.interpolate_curve(data_extractor.data_3m)
+                f = data_extractor.forward_curve(data_extractor.data_3m, method)
             else:  # For 6M, using 3M data for simplicity. Ideally, you'd have 6M data
-                f = data_extractor.interpolate_curve(data_extractor.data_3m)
+                f = data_extractor.forward_curve(data_extractor.data_3m, method)
+
+            lookback_days = st.number_input("Reset Lookback (days)", min_value=0, max_value=30, value=0, step=1)
+            floor = cap = None
+            if st.checkbox("Apply SOFR Floor"):
+                floor = st.number_input("SOFR Floor (%)", value=0.0, step=0.25) / 100.0
+            if st.checkbox("Apply SOFR Cap"):
+                cap = st.number_input("SOFR Cap (%)", value=10.0, step=0.25) / 100.0
+            if floor is not None and cap is not None and floor > cap:
+                st.error("The SOFR floor must not be above the cap.")
+                return
 
 
 
 
 
     if st.button("Generate Amortization"):
-        if amortization_type == "Mortgage Style":
-            mortgage = MortgageStyle(
-                settlement_date, maturity_date, first_payment_date, notional_amount, 
-                rate, basis_numerator, basis_denominator, amortization_years, payment_frequency
-            )
-            df = mortgage.create_mortgage_style_amort()
-        elif amortization_type == "Hybrid Style":
-            mortgage = MortgageStyle(
-                settlement_date, maturity_date, first_payment_date, notional_amount, 
-                rate, basis_numerator, basis_denominator, amortization_years, payment_frequency
-            )
-            df = mortgage.create_hybrid_style_amort()
-        else:
-            sla = StraightLineAmortization(
-                settlement_date, maturity_date, first_payment_date, notional_amount,
-                rate, basis_numerator, basis_denominator, amortization_years, payment_frequency
-            )
-            df = sla.generate_schedule()
+        # Identical terms (and curve) are served from the process-wide schedule cache
+        floating = {}
         if rate_type == "Floating":
-            df = apply_floating_rate(df, f, spread)
-            df['Interest Rate (%)'] = (df['Period Interest'] / df['Outstanding Balance'].shift(1)) * 12 * 100
-            df['Interest Rate (%)'] = df['Interest Rate (%)'].round(2)
+            # Fix each period off the curve on its reset date and accrue on the schedule's basis
+            floating = dict(curve=f, spread=spread, reset_frequency=months_duration, lookback_days=lookback_days,
+                            cap=cap, floor=floor)
+        df = loan_schedule(amortization_type, settlement_date, maturity_date, first_payment_date, notional_amount,
+                           rate, basis_numerator, basis_denominator, amortization_years, payment_frequency,
+                           **floating)
+        cache_stats = default_cache().stats()
+        st.caption(f"Schedule cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
    
         # Calculate additional columns for P+I
         if 'Period Payment' in df.columns and 'Outstanding Balance' in df.columns:
@@ -160,12 +180,6 @@ def main():
             columns = ['Payment Number', 'Period Start Date', 'Period End Date', 'Outstanding Balance', 
                        'Period Payment', 'Principal Payment', 'Period Interest', 'Remaining Notional Balance']
         if rate_type == "Floating":
-            df = apply_floating_rate(df, f, spread)
-            df['Interest Rate (%)'] = (df['Period Interest'] / df['Outstanding Balance'].shift(1)) * 12 * 100
-            df['Interest Rate (%)'] = df['Interest Rate (%)'].round(2)
-            # Set the first period's interest rate to the SOFR rate for the first period plus spread
-            first_period_rate = f(0) + spread
-            df.at[0, 'Interest Rate (%)'] = round(first_period_rate*100,2) # Convert to annual rate in percentage
             columns.append('Interest Rate (%)')  # Only add this column if rate_type is Floating
 
         df = df[columns]
@@ -173,12 +187,9 @@ def main():
         # Display the dataframe
         st.write(df)
 
-        # Download link for Excel
-        towrite = io.BytesIO()
-        downloaded_file = df.to_excel(towrite, encoding='utf-8', index=False, engine='openpyxl')
-        towrite.seek(0)
-        b64 = base64.b64encode(towrite.read()).decode()
-        st.markdown(f'<a href="data:application/vnd.openxmlformats-officedocument.spreadsheetml.sheet;base64,{b64}" download="amortization.xlsx">Download Excel File</a>', unsafe_allow_html=True)
+        # Encoded chunk by chunk and handed over as bytes, without a base64 copy in the page
+        st.download_button(f"Download {download_format} File", export_bytes(df, download_format),
+                           file_name=file_name("amortization", download_format), mime=mime_type(download_format))
 
 if __name__ == "__main__":
     page = st.sidebar.radio("Select Page", ["Home", "Amortization Calculator"])
@@ -5,33 +5,46 @@ Created on Wed Sep  6 17:08:57 2023
 @author: Gilberto
 """
 
-import pandas as pd
 import numpy as np
-from scipy.interpolate import interp1d
-import matplotlib.pyplot as plt
 import os
+from curve_store import default_store
+from forward_curve import ForwardCurve
+from instrumentation import stage, timed
 
 
 class SOFRDataExtractor:
-    def __init__(self, filepath):
+    def __init__(self, filepath, store=None):
         self.filepath = filepath
-        self.data_1m = pd.read_excel(self.filepath, sheet_name="1M_Term_SOFR", skiprows=2)
-        self.data_3m = pd.read_excel(self.filepath, sheet_name="3M_Term_SOFR", skiprows=2)
+        # Parsed sheets are cached by workbook content, so reruns skip pd.read_excel
+        store = store if store is not None else default_store()
+        with stage("sofr_load"):
+            sheets = store.load(self.filepath, sheet_names=("1M_Term_SOFR", "3M_Term_SOFR"), skiprows=2)
+        self.data_1m = sheets["1M_Term_SOFR"]
+        self.data_3m = sheets["3M_Term_SOFR"]
         
     def interpolate_curve(self, df):
+        # scipy and matplotlib are imported on first use to keep module import cheap
+        from scipy.interpolate import interp1d
         start_date = df.iloc[0, 0]
         x = (df.iloc[:, 0] - start_date).dt.total_seconds() / (30.44 * 24 * 60 * 60)  # Convert timedelta to float months assuming avg month length
         y = df.iloc[:, 1]
         f = interp1d(x, y, kind="linear", fill_value="extrapolate")
         return f
+
+    @timed("forward_curve")
+    def forward_curve(self, df, method="linear"):
+        # Vectorized alternative to interpolate_curve; method is "linear", "flat_forward" or "log_linear_df"
+        return ForwardCurve.from_frame(df, method=method)
     
     def plot_curve(self, f, label):
+        import matplotlib.pyplot as plt
         x_new = np.linspace(0, 120, 500)  # plotting for 120 months
         y_new = f(x_new)
      
         plt.plot(x_new, y_new, label=label)
         
     def plot_forward_curves(self):
+        import matplotlib.pyplot as plt
         f_1m = self.interpolate_curve(self.data_1m)
         f_3m = self.interpolate_curve(self.data_3m)
         
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Deterministic inputs shared by the schedule benchmarks and the golden-output check.
+
+Single loans are the app's default terms under every style, frequency and
+day-count basis; synthetic books draw all terms from a seeded generator, so
+the same size and seed always give the same loans.
+"""
+
+import os
+import sys
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from portfolio import HYBRID_STYLE, MORTGAGE_STYLE, STRAIGHT_LINE, STYLES  # noqa: E402
+
+
+SOFR_FILE = os.path.join(ROOT, "SOFR_Data.xls")
+FREQUENCIES = ("1M", "3M", "6M")
+BASES = (("ACT", 360), ("ACT", 365), ("30", 360), ("30", 365))
+CURVE_METHODS = ("linear", "flat_forward", "log_linear_df")
+
+# The calculator's default inputs
+DEFAULT_LOAN = dict(settlement_date="08/01/2022", maturity_date="08/01/2032", first_payment_date="09/01/2022",
+                    notional_amount=600000.0, rate=7.03, amortization_years=25)
+
+
+def single_loans():
+    """(name, terms) for the default loan under every style, frequency and basis."""
+    for style, frequency, (numerator, denominator) in product(STYLES, FREQUENCIES, BASES):
+        terms = dict(DEFAULT_LOAN, basis_numerator=numerator, basis_denominator=denominator,
+                     payment_frequency=frequency, style=style)
+        yield f"{style}/{frequency}/{numerator}/{denominator}", terms
+
+
+def constructor_args(terms):
+    return (terms["settlement_date"], terms["maturity_date"], terms["first_payment_date"], terms["notional_amount"],
+            terms["rate"], terms["basis_numerator"], terms["basis_denominator"], terms["amortization_years"],
+            terms["payment_frequency"])
+
+
+def build_schedule(terms):
+    # The single-loan method for the style, as the app calls it
+    from mortgagestyle_v2 import MortgageStyle
+    from straightline_v2 import StraightLineAmortization
+
+    args = constructor_args(terms)
+    if terms["style"] == MORTGAGE_STYLE:
+        return MortgageStyle(*args).create_mortgage_style_amort()
+    if terms["style"] == HYBRID_STYLE:
+        return MortgageStyle(*args).create_hybrid_style_amort()
+    if terms["style"] == STRAIGHT_LINE:
+        return StraightLineAmortization(*args).generate_schedule()
+    raise ValueError(f"Unknown amortization style: {terms['style']}")
+
+
+def sofr_curves():
+    """{(tenor, method): ForwardCurve} from the bundled SOFR_Data.xls."""
+    from curve_store import CurveStore
+    from SOFRDataExtractor import SOFRDataExtractor
+
+    extractor = SOFRDataExtractor(SOFR_FILE, store=CurveStore(cache_dir=None))
+    return {(tenor, method): extractor.forward_curve(data, method)
+            for tenor, data in (("1M", extractor.data_1m), ("3M", extractor.data_3m)) for method in CURVE_METHODS}
+
+
+def synthetic_book(n, seed=0, styles=STYLES):
+    """Loan table of `n` loans with every style, frequency and basis mixed in."""
+    rng = np.random.RandomState(seed)
+    settlement = np.datetime64("2015-01-01") + rng.randint(0, 15 * 365, n).astype("timedelta64[D]")
+    # First payment a month after settlement (day 1-28), maturity on a month start 1-30 years out
+    first_payment = (settlement.astype("datetime64[M]") + 1).astype("datetime64[D]") + rng.randint(0, 28, n)
+    maturity = (settlement.astype("datetime64[M]") + 12 * rng.randint(1, 31, n)).astype("datetime64[D]")
+    basis = rng.randint(0, len(BASES), n)
+
+    def strings(days):
+        return pd.to_datetime(days).strftime("%m/%d/%Y").to_numpy()
+
+    return pd.DataFrame({
+        "loan_id": np.arange(n),
+        "settlement_date": strings(settlement),
+        "maturity_date": strings(maturity),
+        "first_payment_date": strings(first_payment),
+        "notional_amount": np.round(rng.uniform(1e5, 5e6, n), 2),
+        "rate": np.round(rng.uniform(1.0, 12.0, n), 3),
+        "basis_numerator": np.array([BASES[i][0] for i in basis]),
+        "basis_denominator": np.array([BASES[i][1] for i in basis]),
+        "amortization_years": rng.choice([5, 10, 25, 30], n),
+        "payment_frequency": rng.choice(FREQUENCIES, n),
+        "style": rng.choice(styles, n),
+    })
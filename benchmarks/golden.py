@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+Golden-output regression check for the schedule engines.
+
+Rebuilds a fixed set of schedules and compares them with the reference files
+in benchmarks/golden/: every single-loan style, frequency and basis; the
+mortgage schedule repriced off each bundled SOFR curve; a servicing event
+sequence; and a 100-loan synthetic book in both money modes. Amounts must
+agree to the cent (within half a cent), everything else exactly. The payoff
+check needs no reference file: a payoff on the day before a period end must
+not exceed that period's opening balance plus its scheduled interest. Exits
+non-zero on any difference; --update rewrites the reference files after an
+intended change.
+
+    python benchmarks/golden.py [--update] [--verbose]
+"""
+
+import argparse
+import io
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from cases import (DEFAULT_LOAN, HYBRID_STYLE, STRAIGHT_LINE, build_schedule, constructor_args, single_loans,
+                   sofr_curves, synthetic_book)
+
+from floating_rate import apply_floating_rate
+from money import CENTS, FLOAT
+from mortgagestyle_v2 import MortgageStyle
+from portfolio import MORTGAGE_STYLE, amortize_portfolio
+from servicing import Prepayment, RateChange, Reamortization
+from straightline_v2 import StraightLineAmortization
+
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+TOLERANCE = 0.005
+# gzip with a fixed mtime, so regenerating unchanged output gives identical files
+COMPRESSION = {"method": "gzip", "mtime": 0}
+
+
+def single_schedules():
+    for name, terms in single_loans():
+        yield name, build_schedule(terms)
+
+
+def floating_schedules():
+    schedule = build_schedule(dict(DEFAULT_LOAN, basis_numerator="ACT", basis_denominator=360,
+                                   payment_frequency="1M", style=MORTGAGE_STYLE))
+    for (tenor, method), curve in sofr_curves().items():
+        yield f"{tenor}/{method}", apply_floating_rate(schedule, curve, 0.02, reset_frequency=tenor)
+    curve = sofr_curves()[("3M", "linear")]
+    yield "3M/linear/lookback-cap-floor", apply_floating_rate(schedule, curve, 0.02, reset_frequency="3M",
+                                                              lookback_days=5, cap=0.045, floor=0.01)
+
+
+def servicing_schedules():
+    events = (Prepayment("03/15/2025", 50000.0), RateChange("09/01/2027", 5.5), Reamortization("09/01/2029"))
+    for frequency in ("1M", "3M"):
+        terms = dict(DEFAULT_LOAN, basis_numerator="ACT", basis_denominator=360, payment_frequency=frequency)
+        mortgage = MortgageStyle(*constructor_args(terms))
+        yield f"mortgage/{frequency}", mortgage.apply_events(mortgage.create_mortgage_style_amort(), *events)
+        straight_line = StraightLineAmortization(*constructor_args(terms))
+        yield f"straight_line/{frequency}", straight_line.apply_events(straight_line.generate_schedule(), *events)
+
+
+def portfolio_schedules():
+    book = synthetic_book(100, seed=17)
+    for money in (FLOAT, CENTS):
+        yield money, amortize_portfolio(book, money=money).to_frame()
+
+
+SUITES = {
+    "single": single_schedules,
+    "floating": floating_schedules,
+    "servicing": servicing_schedules,
+    "portfolio": portfolio_schedules,
+}
+
+
+def payoff_problems():
+    """Payoffs on the day before a period end above that period's opening balance plus interest."""
+    problems = []
+    for name, terms in single_loans():
+        if terms["style"] == STRAIGHT_LINE:
+            loan = StraightLineAmortization(*constructor_args(terms))
+            schedule, payoff = loan.generate_schedule(), loan.payoff_amount
+        else:
+            loan = MortgageStyle(*constructor_args(terms))
+            hybrid = terms["style"] == HYBRID_STYLE
+            schedule = loan.create_hybrid_style_amort() if hybrid else loan.create_mortgage_style_amort()
+            payoff = lambda date, loan=loan, hybrid=hybrid: loan.payoff_amount(date, hybrid=hybrid)
+        bounds = schedule["Outstanding Balance"] + schedule["Period Payment"] - schedule["Principal Payment"]
+        days_before = pd.to_datetime(schedule["Period End Date"]) - pd.Timedelta(days=1)
+        for date, bound in zip(days_before.dt.strftime("%m/%d/%Y"), bounds):
+            amount = payoff(date)
+            if amount > bound + TOLERANCE:
+                problems.append(f"{name}: payoff on {date} is {amount!r}, above {round(bound, 2)!r}")
+    return problems
+
+
+# Checks with no reference file, run alongside the suites
+CHECKS = {"payoff": payoff_problems}
+
+
+def build(suite):
+    # One long table per suite: the case name, then the union of the schedules' columns
+    frames = [frame.assign(Case=name).reset_index(drop=True) for name, frame in SUITES[suite]()]
+    table = pd.concat(frames, ignore_index=True)
+    return table[["Case"] + [column for column in table.columns if column != "Case"]]
+
+
+def _normalized(table):
+    # Through CSV text, so the rebuilt output has the same dtypes as the file it is compared with
+    return pd.read_csv(io.StringIO(table.to_csv(index=False)))
+
+
+def compare(expected, actual):
+    """Differences between two suite tables as a list of messages."""
+    problems = []
+    if list(expected.columns) != list(actual.columns):
+        return [f"columns differ: {list(expected.columns)} != {list(actual.columns)}"]
+    cases = expected["Case"].drop_duplicates().tolist()
+    if cases != actual["Case"].drop_duplicates().tolist():
+        return [f"cases differ: {cases} != {actual['Case'].drop_duplicates().tolist()}"]
+    for case in cases:
+        want = expected[expected["Case"] == case].reset_index(drop=True)
+        got = actual[actual["Case"] == case].reset_index(drop=True)
+        if len(want) != len(got):
+            problems.append(f"{case}: {len(got)} rows, expected {len(want)}")
+            continue
+        for column in expected.columns:
+            a, b = want[column], got[column]
+            missing = a.isna() != b.isna()
+            if a.dtype.kind == "f" or b.dtype.kind == "f":
+                bad = missing | ((a - b).abs() > TOLERANCE)
+            else:
+                bad = missing | ((a != b) & a.notna())
+            if bad.any():
+                row = int(np.flatnonzero(bad.to_numpy())[0])
+                problems.append(f"{case}: {column} differs in {int(bad.sum())} rows, first at row {row} "
+                                f"({b.tolist()[row]!r}, expected {a.tolist()[row]!r})")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("suites", nargs="*", default=list(SUITES) + list(CHECKS))
+    parser.add_argument("--update", action="store_true", help="rewrite the reference files")
+    parser.add_argument("--verbose", action="store_true", help="list every difference, not just the first few")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for suite in args.suites:
+        if suite in CHECKS:
+            problems = CHECKS[suite]()
+            failed |= bool(problems)
+            print(f"{suite:<10} {'FAIL' if problems else 'ok'}")
+            for problem in problems if args.verbose else problems[:5]:
+                print(f"    {problem}")
+            continue
+        path = os.path.join(GOLDEN_DIR, f"{suite}.csv.gz")
+        table = build(suite)
+        if args.update:
+            os.makedirs(GOLDEN_DIR, exist_ok=True)
+            table.to_csv(path, index=False, compression=COMPRESSION)
+            print(f"{suite:<10} wrote {len(table)} rows to {os.path.relpath(path)}")
+            continue
+        if not os.path.exists(path):
+            print(f"{suite:<10} missing {os.path.relpath(path)}; run with --update")
+            failed = True
+            continue
+        problems = compare(pd.read_csv(path), _normalized(table))
+        failed |= bool(problems)
+        print(f"{suite:<10} {'FAIL' if problems else 'ok'} ({len(table)} rows)")
+        for problem in problems if args.verbose else problems[:5]:
+            print(f"    {problem}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
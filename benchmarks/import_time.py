@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Cold-start benchmark for the library modules.
+
+Each module is imported in a fresh interpreter, several times, and the import
+wall time is reported (median and best) next to the numpy and pandas floor.
+A module fails the check if importing it prints anything or pulls in one of
+the lazily loaded dependencies (matplotlib, scipy, openpyxl).
+
+    python benchmarks/import_time.py [--repeat 5] [--json report.json] [module ...]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ("schedule_engine", "business_calendar", "mortgagestyle_v2", "straightline_v2", "portfolio",
+           "portfolio_runner", "curve_store", "forward_curve", "floating_rate", "scenarios", "schedule_cache",
+           "SOFRDataExtractor", "export", "instrumentation", "service")
+FLOOR = ("numpy", "pandas")
+LAZY = ("matplotlib", "scipy", "openpyxl")
+
+PROBE = """
+import contextlib, io, json, sys, time
+out = io.StringIO()
+start = time.perf_counter()
+with contextlib.redirect_stdout(out):
+    import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"ms": elapsed * 1e3, "printed": bool(out.getvalue()),
+                  "lazy_loaded": [name for name in {lazy!r} if name in sys.modules]}}))
+"""
+
+
+def measure(module, repeat):
+    runs = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, "-c", PROBE.format(module=module, lazy=LAZY)], cwd=ROOT,
+                                capture_output=True, text=True, check=True)
+        runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    times = [run["ms"] for run in runs]
+    return {
+        "module": module,
+        "median_ms": statistics.median(times),
+        "best_ms": min(times),
+        "printed": any(run["printed"] for run in runs),
+        "lazy_loaded": sorted({name for run in runs for name in run["lazy_loaded"]}),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = [measure(module, args.repeat) for module in FLOOR + tuple(args.modules)]
+    print(f"{'module':<20} {'median ms':>10} {'best ms':>10}  notes")
+    failed = False
+    for result in results:
+        notes = []
+        if result["printed"]:
+            notes.append("prints at import")
+        if result["lazy_loaded"]:
+            notes.append("loads " + ", ".join(result["lazy_loaded"]))
+        failed |= bool(notes) and result["module"] not in FLOOR
+        print(f"{result['module']:<20} {result['median_ms']:>10.1f} {result['best_ms']:>10.1f}  {'; '.join(notes)}")
+
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump({"python": sys.version, "repeat": args.repeat, "results": results}, fh, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
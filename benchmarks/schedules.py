@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput benchmark for the schedule engines.
+
+Covers the single-loan methods (create_mortgage_style_amort,
+create_hybrid_style_amort, generate_schedule) under every frequency and
+day-count basis, apply_floating_rate against the bundled SOFR curves,
+SOFRDataExtractor loading, and synthetic books of 1k/10k/100k loans through
+amortize_portfolio (and, for the smaller books, the per-loan classes via
+run_portfolio). Each case reports the best and median wall time,
+schedules/s, periods/s and tracemalloc peak memory.
+
+    python benchmarks/schedules.py [--repeat 3] [--sizes 1000 10000 100000] [--json report.json]
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+
+from cases import (DEFAULT_LOAN, SOFR_FILE, build_schedule, constructor_args, single_loans, sofr_curves,
+                   synthetic_book)
+
+from curve_store import CurveStore
+from floating_rate import apply_floating_rate, apply_floating_rate_portfolio
+from money import CENTS, FLOAT
+from mortgagestyle_v2 import MortgageStyle
+from portfolio import STYLES, amortize_portfolio
+from portfolio_runner import run_portfolio
+from SOFRDataExtractor import SOFRDataExtractor
+
+
+def measure(name, run, repeat, memory=True):
+    """Time `run()` (which returns (schedules, periods)) `repeat` times, plus one traced run for peak memory."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        schedules, periods = run()
+        times.append(time.perf_counter() - start)
+    peak = None
+    if memory:
+        # A separate run: tracemalloc slows allocation-heavy code down too much to time it
+        tracemalloc.start()
+        try:
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    best = min(times)
+    return {
+        "case": name,
+        "schedules": schedules,
+        "periods": periods,
+        "best_s": best,
+        "median_s": statistics.median(times),
+        "schedules_per_s": schedules / best if best else float("inf"),
+        "periods_per_s": periods / best if best else float("inf"),
+        "peak_mb": None if peak is None else peak / 2 ** 20,
+    }
+
+
+def single_loan_cases(loops):
+    for style in STYLES:
+        loans = [terms for _, terms in single_loans() if terms["style"] == style]
+
+        def run(loans=loans):
+            periods = 0
+            for _ in range(loops):
+                for terms in loans:
+                    periods += len(build_schedule(terms))
+            return loops * len(loans), periods
+
+        yield f"single {style}", run
+
+
+def floating_cases(loops):
+    curves = sofr_curves()
+    schedule = build_schedule(dict(DEFAULT_LOAN, basis_numerator="ACT", basis_denominator=360,
+                                   payment_frequency="1M", style=STYLES[0]))
+    for tenor in ("1M", "3M"):
+        curve = curves[(tenor, "linear")]
+
+        def run(curve=curve, tenor=tenor):
+            for _ in range(loops):
+                apply_floating_rate(schedule, curve, 0.02, reset_frequency=tenor)
+            return loops, loops * len(schedule)
+
+        yield f"apply_floating_rate {tenor} reset", run
+
+
+def sofr_cases():
+    def cold():
+        # A fresh in-memory store, so every run parses the workbook
+        extractor = SOFRDataExtractor(SOFR_FILE, store=CurveStore(cache_dir=None))
+        return 2, len(extractor.data_1m) + len(extractor.data_3m)
+
+    store = CurveStore(cache_dir=None)
+    SOFRDataExtractor(SOFR_FILE, store=store)
+
+    def warm():
+        extractor = SOFRDataExtractor(SOFR_FILE, store=store)
+        return 2, len(extractor.data_1m) + len(extractor.data_3m)
+
+    yield "SOFRDataExtractor parse", cold
+    yield "SOFRDataExtractor cached", warm
+
+
+def portfolio_cases(sizes, class_limit):
+    curve = sofr_curves()[("1M", "linear")]
+    for size in sizes:
+        book = synthetic_book(size)
+        for money in (FLOAT, CENTS):
+            def run(book=book, money=money):
+                schedule = amortize_portfolio(book, money=money)
+                return size, len(schedule)
+
+            yield f"amortize_portfolio {size} {money}", run
+
+        schedule = amortize_portfolio(book, money=FLOAT)
+
+        def floating(schedule=schedule, book=book):
+            apply_floating_rate_portfolio(schedule, curve, spread=0.02,
+                                          basis_numerator=book["basis_numerator"].to_numpy(),
+                                          basis_denominator=book["basis_denominator"].to_numpy())
+            return size, len(schedule)
+
+        yield f"apply_floating_rate_portfolio {size}", floating
+
+        if size <= class_limit:
+            def classes(book=book):
+                return size, len(run_portfolio(book, workers=1))
+
+            yield f"run_portfolio {size} classes", classes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--loops", type=int, default=5, help="passes over the single-loan and floating cases")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[1000, 10000, 100000])
+    parser.add_argument("--class-limit", type=int, default=1000,
+                        help="largest book also run through the per-loan classes")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc peak-memory runs")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args(argv)
+
+    # Warm the lazily built calendar index and imports so the first case is not charged for them
+    MortgageStyle(*constructor_args(dict(DEFAULT_LOAN, basis_numerator="ACT", basis_denominator=360,
+                                         payment_frequency="1M"))).create_mortgage_style_amort()
+
+    cases = [*single_loan_cases(args.loops), *floating_cases(args.loops), *sofr_cases(),
+             *portfolio_cases(args.sizes, args.class_limit)]
+    print(f"{'case':<40} {'best s':>9} {'median s':>9} {'sched/s':>11} {'periods/s':>12} {'peak MB':>8}")
+    results = []
+    for name, run in cases:
+        result = measure(name, run, args.repeat, memory=not args.no_memory)
+        results.append(result)
+        peak = "" if result["peak_mb"] is None else f"{result['peak_mb']:.1f}"
+        print(f"{name:<40} {result['best_s']:>9.4f} {result['median_s']:>9.4f} {result['schedules_per_s']:>11,.0f} "
+              f"{result['periods_per_s']:>12,.0f} {peak:>8}", flush=True)
+
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump({"python": sys.version, "repeat": args.repeat, "results": results}, fh, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
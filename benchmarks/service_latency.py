@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Latency benchmark for the headless calculation service.
+
+Starts service.serve on a local port with the bundled SOFR curves, then runs
+`--clients` keep-alive HTTP clients that each post `--requests` schedule
+requests (the calculator's default loan, every `--floating`-th one floating)
+and reports throughput and client-side p50/p90/p99 latency alongside the
+service's own batch statistics.
+
+    python benchmarks/service_latency.py [--clients 100] [--requests 10] [--workers N] [--json report.json]
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+
+import numpy as np
+
+from cases import DEFAULT_LOAN, SOFR_FILE
+
+from service import CalculationService, load_sofr_curves, serve
+
+
+REQUEST = dict(DEFAULT_LOAN, basis_numerator="ACT", basis_denominator=360, payment_frequency="1M",
+               style="Mortgage Style")
+
+
+async def _call(reader, writer, method, path, body=None):
+    data = b"" if body is None else json.dumps(body).encode()
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line == b"\r\n":
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def _client(port, requests, floating_every, offset):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    latencies = []
+    try:
+        for i in range(requests):
+            body = REQUEST
+            if floating_every and (offset + i) % floating_every == 0:
+                body = dict(REQUEST, floating={"curve": "1M", "spread": 0.02})
+            start = time.perf_counter()
+            status, _ = await _call(reader, writer, "POST", "/schedule", body)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                raise RuntimeError(f"Request failed with HTTP {status}")
+    finally:
+        writer.close()
+    return latencies
+
+
+async def run(args):
+    async with CalculationService(load_sofr_curves(SOFR_FILE), args.workers, args.max_batch,
+                                  args.max_delay_ms / 1000) as service:
+        server = asyncio.create_task(serve(service, "127.0.0.1", args.port))
+        await asyncio.sleep(0.1)
+        # One pass to warm the workers' calendar and payment-grid caches
+        await _client(args.port, 2, 1, 0)
+        service.reset_stats()
+        start = time.perf_counter()
+        per_client = await asyncio.gather(*(_client(args.port, args.requests, args.floating, i)
+                                            for i in range(args.clients)))
+        elapsed = time.perf_counter() - start
+        stats = service.stats()
+        server.cancel()
+        await asyncio.gather(server, return_exceptions=True)
+    latencies = np.array([value for values in per_client for value in values]) * 1000
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99]).tolist()
+    return {"clients": args.clients, "requests": len(latencies), "workers": service.workers,
+            "requests_per_s": len(latencies) / elapsed, "mean_ms": statistics.fmean(latencies),
+            "p50_ms": p50, "p90_ms": p90, "p99_ms": p99, "service": stats}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=10, help="requests per client")
+    parser.add_argument("--floating", type=int, default=4, help="every n-th request is floating (0 for none)")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--max-delay-ms", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(run(args))
+    print(f"{result['requests']} requests from {result['clients']} clients on {result['workers']} workers: "
+          f"{result['requests_per_s']:,.0f} req/s")
+    print(f"latency ms  mean {result['mean_ms']:.2f}  p50 {result['p50_ms']:.2f}  p90 {result['p90_ms']:.2f}  "
+          f"p99 {result['p99_ms']:.2f}")
+    service = result["service"]
+    print(f"service     {service['batches']} batches, mean batch {service['mean_batch']:.1f}, "
+          f"p99 {service['p99_ms']:.2f} ms in service")
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(result, fh, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+Business-day calendars for payment dates.
+
+A BusinessCalendar turns weekends plus a holiday set into a precomputed index:
+for every day in its range it stores the adjusted date under each convention,
+so adjusting a whole grid of dates is a single array lookup. Holiday rules for
+US Federal and SIFMA (US bond market) are generated locally. Payment grids are
+memoized by (first payment date, frequency, count) because most loans in a
+book share them.
+"""
+
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+import numpy as np
+
+
+FOLLOWING = "following"
+MODIFIED_FOLLOWING = "modified_following"
+PRECEDING = "preceding"
+CONVENTIONS = {FOLLOWING: "following", MODIFIED_FOLLOWING: "modifiedfollowing", PRECEDING: "preceding"}
+
+INDEX_START = np.datetime64("1950-01-01")
+INDEX_END = np.datetime64("2101-01-01")
+
+
+def _nth_weekday(year, month, weekday, n):
+    # n-th (1-based) weekday of a month; n = -1 for the last one
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _observed(day):
+    # Saturday holidays are observed the Friday before, Sunday holidays the Monday after
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+def _easter(year):
+    # Anonymous Gregorian algorithm
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    return date(year, month, (h + l - 7 * m + 114) % 31 + 1)
+
+
+def us_federal_holidays(start_year, end_year):
+    holidays = []
+    for year in range(start_year, end_year + 1):
+        holidays += [
+            _observed(date(year, 1, 1)),
+            _nth_weekday(year, 2, 0, 3),    # Washington's Birthday
+            _nth_weekday(year, 5, 0, -1),   # Memorial Day
+            _observed(date(year, 7, 4)),
+            _nth_weekday(year, 9, 0, 1),    # Labor Day
+            _nth_weekday(year, 10, 0, 2),   # Columbus Day
+            _observed(date(year, 11, 11)),  # Veterans Day
+            _nth_weekday(year, 11, 3, 4),   # Thanksgiving
+            _observed(date(year, 12, 25)),
+        ]
+        if year >= 1986:
+            holidays.append(_nth_weekday(year, 1, 0, 3))  # Martin Luther King Jr. Day
+        if year >= 2021:
+            holidays.append(_observed(date(year, 6, 19)))  # Juneteenth
+    return np.array(sorted(set(holidays)), dtype="datetime64[D]")
+
+
+def sifma_holidays(start_year, end_year):
+    # US bond market: the Federal set plus Good Friday; Saturday New Year's and Veterans Days are not moved to Friday
+    holidays = set(us_federal_holidays(start_year, end_year).tolist())
+    for year in range(start_year, end_year + 1):
+        holidays.add(_easter(year) - timedelta(days=2))
+        if date(year, 1, 1).weekday() == 5:
+            holidays.discard(date(year - 1, 12, 31))
+        if date(year, 11, 11).weekday() == 5:
+            holidays.discard(date(year, 11, 10))
+        if year == 2021:
+            # Juneteenth was first observed by the bond market in 2022
+            holidays.discard(date(2021, 6, 18))
+    return np.array(sorted(holidays), dtype="datetime64[D]")
+
+
+class BusinessCalendar:
+    """Weekend mask plus holidays, with a precomputed adjustment index per convention.
+
+    `holidays` may also be a zero-argument callable; it is called on first use,
+    so the built-in calendars cost nothing at import.
+    """
+
+    def __init__(self, holidays=(), weekmask="1111100", name="custom"):
+        self.name = name
+        self.weekmask = weekmask
+        self._holiday_source = holidays
+        self._holidays = None
+        self._busdaycalendar = None
+        self._index = {}
+
+    @property
+    def holidays(self):
+        if self._holidays is None:
+            source = self._holiday_source() if callable(self._holiday_source) else self._holiday_source
+            self._holidays = np.unique(np.asarray(source, dtype="datetime64[D]"))
+        return self._holidays
+
+    @property
+    def busdaycalendar(self):
+        if self._busdaycalendar is None:
+            self._busdaycalendar = np.busdaycalendar(weekmask=self.weekmask, holidays=self.holidays)
+        return self._busdaycalendar
+
+    def __repr__(self):
+        return f"BusinessCalendar({self.name!r})"
+
+    def __reduce__(self):
+        # np.busdaycalendar cannot be pickled; built-in calendars travel by name
+        if CALENDARS.get(self.name) is self:
+            return get_calendar, (self.name,)
+        return BusinessCalendar, (self.holidays, self.weekmask, self.name)
+
+    def _adjusted_index(self, convention):
+        index = self._index.get(convention)
+        if index is None:
+            days = np.arange(INDEX_START, INDEX_END, dtype="datetime64[D]")
+            index = np.busday_offset(days, 0, roll=CONVENTIONS[convention], busdaycal=self.busdaycalendar)
+            self._index[convention] = index
+        return index
+
+    def is_business_day(self, dates):
+        return np.is_busday(np.asarray(dates, dtype="datetime64[D]"), busdaycal=self.busdaycalendar)
+
+    def adjust(self, dates, convention=FOLLOWING):
+        """Adjust datetime64[D] dates (any shape) to business days."""
+        if convention not in CONVENTIONS:
+            raise ValueError(f"Unknown business day convention: {convention}")
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        offsets = (dates - INDEX_START).astype(np.int64)
+        index = self._adjusted_index(convention)
+        if dates.size and (offsets.min() < 0 or offsets.max() >= len(index)):
+            return np.busday_offset(dates, 0, roll=CONVENTIONS[convention], busdaycal=self.busdaycalendar)
+        return index[offsets]
+
+    def adjust_date(self, day, convention=FOLLOWING):
+        # Scalar form for date/datetime objects, keeping the caller's type
+        adjusted = self.adjust(np.datetime64(day, "D"), convention).astype(object)
+        if isinstance(day, datetime):
+            return datetime.combine(adjusted, day.time())
+        return adjusted
+
+
+WEEKENDS = BusinessCalendar(name="weekends")
+US_FEDERAL = BusinessCalendar(lambda: us_federal_holidays(1950, 2100), name="us_federal")
+SIFMA = BusinessCalendar(lambda: sifma_holidays(1950, 2100), name="sifma")
+CALENDARS = {calendar.name: calendar for calendar in (WEEKENDS, US_FEDERAL, SIFMA)}
+
+
+def get_calendar(calendar=None):
+    # None means the historical behaviour: roll off weekends only
+    if calendar is None:
+        return WEEKENDS
+    if isinstance(calendar, BusinessCalendar):
+        return calendar
+    return CALENDARS[calendar]
+
+
+@lru_cache(maxsize=4096)
+def _payment_grid(first_payment, months_increment, count, calendar, convention):
+    first_month = first_payment.astype("datetime64[M]")
+    first_day = int((first_payment - first_month.astype("datetime64[D]")).astype(np.int64))
+    months = first_month + np.arange(count, dtype=np.int64) * months_increment
+    ends = months.astype("datetime64[D]") + first_day
+    in_month = ends.astype("datetime64[M]") == months
+    # The first payment date is taken as given; later ones are adjusted
+    payment_dates = ends.copy()
+    payment_dates[1:] = calendar.adjust(ends[1:], convention)
+    for values in (ends, in_month, payment_dates):
+        values.setflags(write=False)
+    return ends, in_month, payment_dates
+
+
+def payment_grid(first_payment, months_increment, count, calendar=None, convention=FOLLOWING):
+    """Memoized period ends and payment dates rolled from first_payment.
+
+    Returns read-only (ends, in_month, payment_dates) arrays of length `count`;
+    in_month is False where the payment day does not exist in that month.
+    """
+    return _payment_grid(np.datetime64(first_payment, "D"), int(months_increment), int(count),
+                         get_calendar(calendar), convention)
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Parse-once store for SOFR curve workbooks.
+
+Workbooks are keyed by a SHA-256 of their bytes (plus the sheets and skiprows
+asked for). The first load parses with pd.read_excel and writes the columns to
+an uncompressed .npz file; later loads come from an in-memory LRU or, in a new
+process, from that .npz, without touching xlrd/openpyxl again.
+"""
+
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import count
+
+
+SOFR_SHEETS = ("1M_Term_SOFR", "3M_Term_SOFR")
+DEFAULT_CACHE_DIR = os.environ.get("SOFR_CURVE_CACHE", os.path.join(tempfile.gettempdir(), "sofr_curve_cache"))
+CACHE_VERSION = 1
+
+
+def _read_bytes(source):
+    # Paths, or file-like objects such as Streamlit's UploadedFile
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as fh:
+            return fh.read()
+    if hasattr(source, "getvalue"):
+        return source.getvalue()
+    position = source.tell()
+    content = source.read()
+    source.seek(position)
+    return content
+
+
+def _encode_label(label):
+    # Header cells keep their type; with skiprows=2 the first data row is the header
+    if isinstance(label, pd.Timestamp):
+        return "timestamp", label.isoformat()
+    if isinstance(label, datetime):
+        return "datetime", label.isoformat()
+    if isinstance(label, float):
+        return "float", repr(label)
+    if isinstance(label, (int, np.integer)):
+        return "int", str(label)
+    return "str", str(label)
+
+
+def _decode_label(kind, text):
+    if kind == "timestamp":
+        return pd.Timestamp(text)
+    if kind == "datetime":
+        return datetime.fromisoformat(text)
+    if kind == "float":
+        return float(text)
+    if kind == "int":
+        return int(text)
+    return text
+
+
+def _to_arrays(frames):
+    # Flatten {sheet: DataFrame} into plain, pickle-free arrays for np.savez
+    arrays = {"version": np.array(CACHE_VERSION)}
+    for s, (sheet, df) in enumerate(frames.items()):
+        arrays[f"s{s}_name"] = np.array(sheet)
+        kinds, labels = zip(*(_encode_label(label) for label in df.columns)) if len(df.columns) else ((), ())
+        arrays[f"s{s}_label_kinds"] = np.array(kinds, dtype=str)
+        arrays[f"s{s}_labels"] = np.array(labels, dtype=str)
+        for c in range(df.shape[1]):
+            values = df.iloc[:, c].to_numpy()
+            arrays[f"s{s}_c{c}"] = values.astype(str) if values.dtype == object else values
+    return arrays
+
+
+def _from_arrays(arrays):
+    frames = {}
+    s = 0
+    while f"s{s}_name" in arrays:
+        columns = [_decode_label(kind, text) for kind, text in
+                   zip(arrays[f"s{s}_label_kinds"].tolist(), arrays[f"s{s}_labels"].tolist())]
+        data = {c: arrays[f"s{s}_c{c}"] for c in range(len(columns))}
+        df = pd.DataFrame(data)
+        df.columns = columns
+        frames[str(arrays[f"s{s}_name"])] = df
+        s += 1
+    return frames
+
+
+class CurveStore:
+    """Content-addressed cache of parsed curve workbooks.
+
+    `cache_dir=None` keeps the cache in memory only; `max_entries` bounds the
+    in-memory LRU. The LRU is locked, so one store can serve several threads;
+    parsing and disk I/O run outside the lock.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_entries=8):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def key(self, content, sheet_names=SOFR_SHEETS, skiprows=2):
+        digest = hashlib.sha256(content)
+        digest.update(repr((CACHE_VERSION, tuple(sheet_names), skiprows)).encode())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def _remember(self, key, arrays):
+        with self._lock:
+            self._entries[key] = arrays
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _load_disk(self, key):
+        if self.cache_dir is None:
+            return None
+        try:
+            with np.load(self._path(key), allow_pickle=False) as npz:
+                arrays = {name: npz[name] for name in npz.files}
+        except (OSError, ValueError):
+            return None
+        return arrays if int(arrays.get("version", -1)) == CACHE_VERSION else None
+
+    def _save_disk(self, key, arrays):
+        if self.cache_dir is None:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Write to a temporary name first so a concurrent reader never sees half a file
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".npz.tmp")
+            with os.fdopen(fd, "wb") as fh:
+                np.savez(fh, **arrays)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            # The on-disk cache is best effort; the in-memory copy is still used
+            pass
+
+    def load(self, source, sheet_names=SOFR_SHEETS, skiprows=2):
+        """Return {sheet name: DataFrame} for `source`, parsing it only if unseen.
+
+        The DataFrames are the same as pd.read_excel(source, sheet_name=...,
+        skiprows=skiprows) and are freshly built on each call, so callers may
+        modify them.
+        """
+        content = _read_bytes(source)
+        key = self.key(content, sheet_names, skiprows)
+        with self._lock:
+            arrays = None
+            if key in self._entries:
+                self.hits += 1
+                count("curve_store_hits")
+                self._entries.move_to_end(key)
+                arrays = self._entries[key]
+        if arrays is not None:
+            return _from_arrays(arrays)
+
+        arrays = self._load_disk(key)
+        with self._lock:
+            if arrays is not None:
+                self.disk_hits += 1
+                count("curve_store_disk_hits")
+            else:
+                self.misses += 1
+                count("curve_store_parses")
+        if arrays is None:
+            # One workbook open for all sheets instead of one pd.read_excel per sheet
+            with pd.ExcelFile(io.BytesIO(content)) as workbook:
+                frames = {sheet: workbook.parse(sheet, skiprows=skiprows) for sheet in sheet_names}
+            arrays = _to_arrays(frames)
+            self._save_disk(key, arrays)
+        self._remember(key, arrays)
+        return _from_arrays(arrays)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_default_store = None
+
+
+def default_store():
+    # One store per process, so Streamlit reruns share parsed curves
+    global _default_store
+    if _default_store is None:
+        _default_store = CurveStore()
+    return _default_store
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk export of schedules.
+
+Single-loan schedule DataFrames and PortfolioSchedules are written out in
+row slices, so a large book never needs to exist as one DataFrame. CSV is
+written chunk by chunk, Parquet as one row group per chunk and Arrow as an IPC
+file of record batches. Excel is kept as an optional format through openpyxl's
+write-only workbook, which streams rows to disk and starts a new sheet whenever
+the row limit is reached. pyarrow and openpyxl are imported on first use.
+"""
+
+import io
+import os
+from importlib.util import find_spec
+
+from instrumentation import count, timed
+from portfolio import PortfolioSchedule
+
+
+CSV = "CSV"
+PARQUET = "Parquet"
+ARROW = "Arrow"
+EXCEL = "Excel"
+
+# Format -> (file extension, MIME type, module it needs)
+FORMATS = {
+    CSV: ("csv", "text/csv", None),
+    PARQUET: ("parquet", "application/vnd.apache.parquet", "pyarrow"),
+    ARROW: ("arrow", "application/vnd.apache.arrow.file", "pyarrow"),
+    EXCEL: ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "openpyxl"),
+}
+
+CHUNK_ROWS = 100000
+EXCEL_MAX_ROWS = 1048576
+
+
+def available_formats():
+    # Formats whose optional dependency is installed, in FORMATS order
+    return [name for name, (_, _, module) in FORMATS.items() if module is None or find_spec(module) is not None]
+
+
+def iter_frames(data, chunk_rows=CHUNK_ROWS):
+    """Yield `data` (a DataFrame or PortfolioSchedule) as DataFrames of at most `chunk_rows` rows.
+
+    An empty input yields one empty DataFrame so writers still see the columns.
+    """
+    rows = len(data)
+    count("export_rows", rows)
+    for start in range(0, max(rows, 1), chunk_rows):
+        if isinstance(data, PortfolioSchedule):
+            yield data.to_frame(start, start + chunk_rows)
+        else:
+            yield data.iloc[start:start + chunk_rows]
+
+
+def _open(target):
+    # Paths are opened (and later closed) here; file objects are written to as given
+    if isinstance(target, (str, os.PathLike)):
+        return open(target, "wb"), True
+    return target, False
+
+
+def write_csv(data, target, chunk_rows=CHUNK_ROWS):
+    fh, owned = _open(target)
+    try:
+        for i, frame in enumerate(iter_frames(data, chunk_rows)):
+            fh.write(frame.to_csv(index=False, header=i == 0).encode("utf-8"))
+    finally:
+        if owned:
+            fh.close()
+
+
+def _record_batches(data, chunk_rows):
+    import pyarrow as pa
+
+    schema = None
+    for frame in iter_frames(data, chunk_rows):
+        # Later chunks are cast to the first chunk's schema (an all-null column would otherwise change type)
+        batch = pa.RecordBatch.from_pandas(frame, schema=schema, preserve_index=False)
+        schema = batch.schema
+        yield batch
+
+
+def write_parquet(data, target, chunk_rows=CHUNK_ROWS, compression="snappy"):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for batch in _record_batches(data, chunk_rows):
+            if writer is None:
+                writer = pq.ParquetWriter(target, batch.schema, compression=compression)
+            writer.write_table(pa.Table.from_batches([batch]))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def write_arrow(data, target, chunk_rows=CHUNK_ROWS):
+    import pyarrow as pa
+
+    writer = None
+    try:
+        for batch in _record_batches(data, chunk_rows):
+            if writer is None:
+                writer = pa.ipc.new_file(target, batch.schema)
+            writer.write_batch(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def write_excel(data, target, chunk_rows=CHUNK_ROWS, sheet_name="Schedule"):
+    """Write `data` through a write-only workbook; rows past the Excel limit go to further sheets."""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = None
+    sheets = rows = 0
+    for frame in iter_frames(data, chunk_rows):
+        # Series.tolist() gives Python scalars and Timestamps, which openpyxl writes natively
+        columns = [frame[name].tolist() for name in frame.columns]
+        for row in zip(*columns) if columns else ():
+            if sheet is None or rows == EXCEL_MAX_ROWS:
+                sheets += 1
+                sheet = workbook.create_sheet(sheet_name if sheets == 1 else f"{sheet_name} {sheets}")
+                sheet.append(list(frame.columns))
+                rows = 1
+            sheet.append(row)
+            rows += 1
+    if sheet is None:
+        workbook.create_sheet(sheet_name).append(list(frame.columns))
+    workbook.save(target)
+
+
+WRITERS = {CSV: write_csv, PARQUET: write_parquet, ARROW: write_arrow, EXCEL: write_excel}
+
+
+@timed("export")
+def export(data, target, fmt=CSV, chunk_rows=CHUNK_ROWS):
+    """Write `data` to `target` (a path or binary file object) in format `fmt`."""
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    WRITERS[fmt](data, target, chunk_rows)
+
+
+def export_bytes(data, fmt=CSV, chunk_rows=CHUNK_ROWS):
+    # The encoded file only; no DataFrame copy of the whole book is ever built
+    buffer = io.BytesIO()
+    export(data, buffer, fmt, chunk_rows)
+    return buffer.getvalue()
+
+
+def file_name(stem, fmt):
+    return f"{stem}.{FORMATS[fmt][0]}"
+
+
+def mime_type(fmt):
+    return FORMATS[fmt][1]
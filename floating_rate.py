@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized floating-rate engine.
+
+Each period's rate is fixed from the forward curve on a real reset schedule
+aligned with the payment grid: resets fall every `reset_frequency` months from
+the first period end (the first payment date), a period uses the latest reset
+on or before its start, and a stub period that starts before the first reset
+fixes on its own start. The curve is read `lookback_days` before the reset.
+Interest accrues on the period's actual dates using the schedule's day-count
+basis, rescaled to 360 on a 365 denominator as compute_days does. Everything
+is computed over whole arrays, so one call can price a single schedule, a
+PortfolioSchedule, or either against several curves at once.
+"""
+
+import numpy as np
+
+from instrumentation import timed
+from schedule_engine import MONTHS_PER_PERIOD, basis_days, round_cents, to_days
+
+
+def _month_day(days):
+    months = days.astype("datetime64[M]")
+    return months, (days - months.astype("datetime64[D]")).astype(np.int64)
+
+
+def add_months_clipped(anchor, months):
+    # anchor + months, with the day clipped to the end of shorter months
+    anchor_month, anchor_day = _month_day(anchor)
+    target = anchor_month + months
+    last_day = ((target + 1).astype("datetime64[D]") - target.astype("datetime64[D]")).astype(np.int64) - 1
+    return target.astype("datetime64[D]") + np.minimum(anchor_day, last_day)
+
+
+def reset_dates(anchor, period_starts, reset_months):
+    """Latest anchor + k * reset_months (k >= 0) on or before each period start."""
+    anchor = np.asarray(anchor, dtype="datetime64[D]")
+    period_starts = np.asarray(period_starts, dtype="datetime64[D]")
+    elapsed = (period_starts.astype("datetime64[M]") - anchor.astype("datetime64[M]")).astype(np.int64)
+    k = np.maximum(elapsed // reset_months, 0)
+    resets = add_months_clipped(anchor, k * reset_months)
+    # The same calendar month can still be past the start when the anchor day is later in the month
+    late = (resets > period_starts) & (k > 0)
+    k = np.where(late, k - 1, k)
+    return np.where(late, add_months_clipped(anchor, k * reset_months), resets)
+
+
+def day_count(period_starts, period_ends, basis_numerator):
+    """Days accrued per period: actual days for "ACT", 30/360 (bond basis) for "30".
+
+    _compute_days treats every "30" period as 30 days; here a quarter accrues
+    90 and a half year 180, which is what the 30-day month assumption means.
+    """
+    period_starts = np.asarray(period_starts, dtype="datetime64[D]")
+    period_ends = np.asarray(period_ends, dtype="datetime64[D]")
+    actual = (period_ends - period_starts).astype(np.int64)
+
+    start_month, start_day = _month_day(period_starts)
+    end_month, end_day = _month_day(period_ends)
+    d1 = np.minimum(start_day + 1, 30)
+    d2 = np.where((end_day + 1 == 31) & (d1 == 30), 30, end_day + 1)
+    thirty = 30 * (end_month - start_month).astype(np.int64) + (d2 - d1)
+    return np.where(np.asarray(basis_numerator) == "ACT", actual, thirty)
+
+
+def fixing_schedule(period_starts, period_ends, reset_frequency="1M", basis_numerator="ACT", basis_denominator=360,
+                    reset_anchor=None, lookback_days=0):
+    """The rate-independent half of the engine: reset dates, fixing dates and accrual fractions."""
+    period_starts = to_days(period_starts)
+    period_ends = to_days(period_ends)
+    if reset_anchor is None:
+        reset_anchor = period_ends[:1] if len(period_ends) else period_ends
+    # Periods starting before the first reset (a stub after settlement) fix on their own start
+    resets = np.minimum(reset_dates(reset_anchor, period_starts, MONTHS_PER_PERIOD[reset_frequency]), period_starts)
+    fixing_dates = resets - np.asarray(lookback_days, dtype="timedelta64[D]")
+    accrual = (basis_days(day_count(period_starts, period_ends, basis_numerator), basis_denominator)
+               / np.asarray(basis_denominator, dtype=np.float64))
+    return resets, fixing_dates, accrual
+
+
+def check_bounds(cap, floor):
+    # np.clip would silently return the cap wherever the floor is above it
+    if cap is not None and floor is not None and np.any(np.asarray(floor) > np.asarray(cap)):
+        raise ValueError("The SOFR floor is above the cap")
+
+
+def price_fixings(index_rate, spread, opening_balance, principal, accrual, cap=None, floor=None):
+    # Index fixings (any leading shape) -> all-in rate, rounded interest and payment
+    check_bounds(cap, floor)
+    if floor is not None or cap is not None:
+        index_rate = np.clip(index_rate, floor, cap)
+    rate = index_rate + spread
+    interest = round_cents(np.asarray(opening_balance, dtype=np.float64) * rate * accrual)
+    payment = round_cents(interest + np.asarray(principal, dtype=np.float64))
+    return index_rate, rate, interest, payment
+
+
+def floating_rate_arrays(period_starts, period_ends, opening_balance, principal, curve, spread=0.0,
+                         reset_frequency="1M", basis_numerator="ACT", basis_denominator=360, reset_anchor=None,
+                         lookback_days=0, cap=None, floor=None):
+    """Fix, accrue and pay every period in one pass.
+
+    Arrays are per period (long format for many loans, with `reset_anchor`
+    giving each row's first reset; by default the first period end, so resets
+    stay on the payment grid). `curve` is a ForwardCurve, or a list of them,
+    in which case every result gains a leading curve axis. `cap` and `floor`
+    bound the index rate before the spread is added; a floor above the cap
+    raises ValueError. Rates, spread, cap and floor are decimals.
+    """
+    resets, fixing_dates, accrual = fixing_schedule(period_starts, period_ends, reset_frequency, basis_numerator,
+                                                    basis_denominator, reset_anchor, lookback_days)
+    if isinstance(curve, (list, tuple)):
+        index_rate = np.stack([c.at_dates(fixing_dates) for c in curve])
+    else:
+        index_rate = curve.at_dates(fixing_dates)
+    index_rate, rate, interest, payment = price_fixings(index_rate, spread, opening_balance, principal, accrual,
+                                                        cap, floor)
+    return {
+        "reset_date": resets,
+        "fixing_date": fixing_dates,
+        "index_rate": index_rate,
+        "rate": rate,
+        "accrual": accrual,
+        "interest": interest,
+        "payment": payment,
+    }
+
+
+@timed("floating_rate")
+def apply_floating_rate(df, curve, spread, reset_frequency="1M", basis_numerator="ACT", basis_denominator=360,
+                        lookback_days=0, cap=None, floor=None):
+    """Reprice a schedule DataFrame off `curve`; returns a new DataFrame.
+
+    Principal and outstanding balance are kept; 'Period Interest',
+    'Period Payment' and 'Interest Rate (%)' are (re)computed for every period.
+    """
+    result = floating_rate_arrays(df['Period Start Date'].to_numpy(), df['Period End Date'].to_numpy(),
+                                  df['Outstanding Balance'].to_numpy(), df['Principal Payment'].to_numpy(),
+                                  curve, spread, reset_frequency, basis_numerator, basis_denominator,
+                                  lookback_days=lookback_days, cap=cap, floor=floor)
+    df = df.copy()
+    df['Period Interest'] = result["interest"]
+    df['Period Payment'] = result["payment"]
+    df['Interest Rate (%)'] = np.round(result["rate"] * 100, 2)
+    return df
+
+
+def portfolio_rows(schedule, **loan_terms):
+    """Expand loan-level terms (scalars or one value per loan) to one value per schedule row.
+
+    Also returns each row's reset anchor, the loan's first period end.
+    """
+    counts = np.diff(schedule.offsets)
+    rows = {}
+    for name, value in loan_terms.items():
+        value = np.asarray(value) if value is not None else None
+        rows[name] = np.repeat(value, counts) if value is not None and value.ndim else value
+    ends = schedule["period_end"]
+    rows["reset_anchor"] = np.repeat(ends[schedule.offsets[:-1][counts > 0]], counts[counts > 0])
+    return rows
+
+
+@timed("floating_rate")
+def apply_floating_rate_portfolio(schedule, curve, spread=0.0, reset_frequency="1M", basis_numerator="ACT",
+                                  basis_denominator=360, lookback_days=0, cap=None, floor=None):
+    """floating_rate_arrays over a PortfolioSchedule.
+
+    Loan-level terms (spread, basis, lookback, cap, floor) may be scalars or one
+    value per loan in schedule order.
+    """
+    rows = portfolio_rows(schedule, spread=spread, basis_numerator=basis_numerator,
+                          basis_denominator=basis_denominator, lookback_days=lookback_days, cap=cap, floor=floor)
+    return floating_rate_arrays(schedule["period_start"], schedule["period_end"],
+                                schedule.amounts("outstanding_balance"), schedule.amounts("principal_payment"),
+                                curve, reset_frequency=reset_frequency, **rows)
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized forward-curve evaluation.
+
+ForwardCurve precomputes knots and per-segment slopes once and evaluates a
+whole array of times with a single np.searchsorted, instead of paying scipy's
+interp1d dispatch on every scalar call. Times are months since the first curve
+date, as in SOFRDataExtractor.interpolate_curve.
+"""
+
+import numpy as np
+
+
+# Same month length as SOFRDataExtractor.interpolate_curve
+SECONDS_PER_MONTH = 30.44 * 24 * 60 * 60
+METHODS = ("linear", "flat_forward", "log_linear_df")
+
+
+def months_between(start, dates):
+    # (dates - start) in the 30.44-day months used by interpolate_curve
+    elapsed = (np.asarray(dates, dtype="datetime64[us]") - np.datetime64(start, "us")).astype(np.int64)
+    return elapsed / 1e6 / SECONDS_PER_MONTH
+
+
+class ForwardCurve:
+    """Callable forward curve: curve(t) for t in months since the curve start.
+
+    Methods:
+      linear         straight lines between knots, extrapolating the end
+                     segments; identical to interp1d(kind="linear",
+                     fill_value="extrapolate")
+      flat_forward   each knot's rate is held until the next knot
+      log_linear_df  rates are read as continuously compounded zero rates and
+                     ln(discount factor) is interpolated linearly; returns the
+                     implied zero rate
+    """
+
+    def __init__(self, x, y, method="linear", start=None):
+        if method not in METHODS:
+            raise ValueError(f"Unknown interpolation method: {method}")
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        if x.ndim != 1 or x.shape != y.shape or len(x) < 2:
+            raise ValueError("Curve needs matching 1-D knot arrays with at least two points")
+        order = np.argsort(x, kind="stable")
+        self.x = x[order]
+        self.y = y[order]
+        self.method = method
+        self.start = start
+
+        if method == "log_linear_df":
+            # -ln(DF) is proportional to rate * time; the year fraction cancels out
+            knots = self.y * self.x
+        else:
+            knots = self.y
+        self._knots = knots
+        self._slopes = np.diff(knots) / np.diff(self.x)
+
+    @classmethod
+    def from_frame(cls, df, method="linear"):
+        # First column: curve dates, second column: rates (the SOFRDataExtractor sheets)
+        dates = df.iloc[:, 0].to_numpy().astype("datetime64[us]")
+        return cls(months_between(dates[0], dates), df.iloc[:, 1].to_numpy(), method=method, start=dates[0])
+
+    def __call__(self, t):
+        t = np.asarray(t, dtype=np.float64)
+        flat = t.reshape(-1)
+        if self.method == "flat_forward":
+            index = np.searchsorted(self.x, flat, side="right") - 1
+            values = self.y[np.clip(index, 0, len(self.x) - 1)]
+            return values.reshape(t.shape)
+
+        # Same segment choice as interp1d: the left neighbour, clipped to the end segments
+        lo = np.clip(np.searchsorted(self.x, flat), 1, len(self.x) - 1) - 1
+        values = self._slopes[lo] * (flat - self.x[lo]) + self._knots[lo]
+        if self.method == "log_linear_df":
+            with np.errstate(divide="ignore", invalid="ignore"):
+                values = np.where(flat > 0, values / flat, self.y[0])
+        return values.reshape(t.shape)
+
+    def at_dates(self, dates):
+        # Evaluate at calendar dates (datetime64 or anything np.asarray understands)
+        if self.start is None:
+            raise ValueError("Curve has no start date; build it with ForwardCurve.from_frame")
+        return self(months_between(self.start, dates))
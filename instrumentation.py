@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+Opt-in timers and counters for the schedule hot paths.
+
+Library code marks its stages with `timed` (a decorator) or `stage` (a
+context manager) and bumps counters with `count`. Nothing is measured unless
+a run is wrapped in `record()`; outside one, a stage costs a single context
+variable lookup. The Recorder that record() yields holds per-stage call counts and wall
+times plus the counters, and gives them back as a dict or JSON. A recorder can
+also profile one stage, with cProfile or tracemalloc, every time it runs.
+
+    with record(profile_stage="mortgage_balances", profiler=CPROFILE) as recorder:
+        MortgageStyle(...).create_mortgage_style_amort()
+    print(recorder.to_json())
+
+Stages nest, so a stage's time includes that of the stages it calls. The
+active recorder is a context variable, so concurrent runs on other threads
+(Streamlit sessions, say) or asyncio tasks are neither recorded nor affected.
+"""
+
+import io
+import json
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+
+# Stage names used across the library, for pickers such as the app's timing panel
+STAGES = ("sofr_load", "forward_curve", "date_grid", "date_grids", "mortgage_balances", "block_means",
+          "hybrid_balances", "straight_line_schedule", "mortgage_cents", "hybrid_cents", "straight_line_cents",
+          "portfolio_chunk", "schedule_frame", "floating_rate", "servicing_events", "export")
+
+CPROFILE = "cprofile"
+TRACEMALLOC = "tracemalloc"
+PROFILERS = (CPROFILE, TRACEMALLOC)
+
+_active = ContextVar("instrumentation_recorder", default=None)
+
+
+class _Stage:
+    __slots__ = ("recorder", "name", "start")
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        if self.name == self.recorder.profile_stage:
+            self.recorder._start_profile()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        if self.name == self.recorder.profile_stage:
+            self.recorder._stop_profile()
+        self.recorder.add_time(self.name, elapsed)
+        return False
+
+
+class _NoStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+class Recorder:
+    """Stage timings and counters for one instrumented run.
+
+    `profile_stage` names a stage to run under `profiler` (CPROFILE or
+    TRACEMALLOC) each time it is entered; report() gives the cumulative
+    cProfile statistics, or the peak traced memory over all calls and the
+    largest allocations left by the latest one.
+    """
+
+    def __init__(self, profile_stage=None, profiler=CPROFILE, top=20):
+        if profiler not in PROFILERS:
+            raise ValueError(f"Unknown profiler: {profiler}")
+        self.profile_stage = profile_stage
+        self.profiler = profiler
+        self.top = top
+        self.stages = {}
+        self.counters = {}
+        self.started = time.perf_counter()
+        self.elapsed = None
+        self._profile = None
+        self._profile_depth = 0
+        self._was_tracing = False
+        self._peak = 0
+
+    def add_time(self, name, seconds):
+        entry = self.stages.get(name)
+        if entry is None:
+            self.stages[name] = [1, seconds, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+    def add_count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def _start_profile(self):
+        # Re-entrant: only the outermost call of the profiled stage starts and stops the profiler
+        self._profile_depth += 1
+        if self._profile_depth > 1:
+            return
+        if self.profiler == CPROFILE:
+            import cProfile
+
+            if self._profile is None:
+                self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            import tracemalloc
+
+            # Leave an outer tracemalloc session (a benchmark, say) running; only its peak is reset
+            self._was_tracing = tracemalloc.is_tracing()
+            if self._was_tracing:
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+
+    def _stop_profile(self):
+        self._profile_depth -= 1
+        if self._profile_depth:
+            return
+        if self.profiler == CPROFILE:
+            self._profile.disable()
+        else:
+            import tracemalloc
+
+            snapshot = tracemalloc.take_snapshot()
+            self._peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+            if not self._was_tracing:
+                tracemalloc.stop()
+            # Allocations still alive at the end of the latest call
+            self._profile = [str(stat) for stat in snapshot.statistics("lineno")[:self.top]]
+
+    def _profile_report(self):
+        if self.profile_stage is None or self._profile is None:
+            return None
+        if self.profiler == CPROFILE:
+            import pstats
+
+            out = io.StringIO()
+            pstats.Stats(self._profile, stream=out).sort_stats("cumulative").print_stats(self.top)
+            return {"stage": self.profile_stage, "profiler": CPROFILE, "stats": out.getvalue()}
+        return {"stage": self.profile_stage, "profiler": TRACEMALLOC, "peak_bytes": self._peak,
+                "top_allocations": self._profile}
+
+    def stop(self):
+        if self.elapsed is None:
+            self.elapsed = time.perf_counter() - self.started
+
+    def report(self):
+        """Stages (sorted by total time), counters and any profile, as plain JSON-ready data."""
+        elapsed = self.elapsed if self.elapsed is not None else time.perf_counter() - self.started
+        stages = [{"stage": name, "calls": calls, "total_s": total, "mean_s": total / calls, "max_s": longest}
+                  for name, (calls, total, longest) in self.stages.items()]
+        stages.sort(key=lambda entry: entry["total_s"], reverse=True)
+        return {"elapsed_s": elapsed, "stages": stages, "counters": dict(sorted(self.counters.items())),
+                "profile": self._profile_report()}
+
+    def to_json(self, path=None, indent=2):
+        text = json.dumps(self.report(), indent=indent)
+        if path is not None:
+            with open(path, "w") as fh:
+                fh.write(text)
+        return text
+
+
+@contextmanager
+def record(profile_stage=None, profiler=CPROFILE, top=20):
+    """Record every instrumented stage run inside the block; yields the Recorder."""
+    recorder = Recorder(profile_stage, profiler, top)
+    token = _active.set(recorder)
+    try:
+        yield recorder
+    finally:
+        recorder.stop()
+        _active.reset(token)
+
+
+def stage(name):
+    # Context manager form, for stages that are not a whole function
+    recorder = _active.get()
+    return _NO_STAGE if recorder is None else _Stage(recorder, name)
+
+
+def timed(name):
+    """Decorator timing every call of the function as stage `name` while recording."""
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            recorder = _active.get()
+            if recorder is None:
+                return func(*args, **kwargs)
+            with _Stage(recorder, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count(name, n=1):
+    recorder = _active.get()
+    if recorder is not None:
+        recorder.add_count(name, n)
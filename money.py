@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Integer-cents money mode.
+
+Balances, principal and payments are carried as int64 cents, so repeated
+subtraction cannot drift and every schedule reconciles exactly. The only
+non-integer step is interest (balance x rate x accrual), which is rounded to a
+whole cent once per period under an explicit policy. With `plug` the final
+period's principal is the remaining balance, so each loan ends at exactly zero.
+All functions work on (periods x loans) arrays with `counts` periods in use
+per loan.
+"""
+
+import numpy as np
+
+from instrumentation import timed
+
+
+FLOAT = "float"
+CENTS = "cents"
+MONEY_MODES = (FLOAT, CENTS)
+
+HALF_UP = "half_up"
+HALF_EVEN = "half_even"
+ROUNDING = (HALF_UP, HALF_EVEN)
+
+
+def _check_rounding(rounding):
+    if rounding not in ROUNDING:
+        raise ValueError(f"Unknown rounding policy: {rounding}")
+
+
+def round_half(values, rounding=HALF_UP):
+    """Round float cents to int64 cents: HALF_UP (ties away from zero) or HALF_EVEN (banker's)."""
+    _check_rounding(rounding)
+    # Absorb binary representation error so that decimal ties such as x.5 are treated as ties
+    values = np.round(np.asarray(values, dtype=np.float64), 6)
+    if rounding == HALF_EVEN:
+        return np.rint(values).astype(np.int64)
+    return (np.sign(values) * np.floor(np.abs(values) + 0.5)).astype(np.int64)
+
+
+def to_cents(dollars, rounding=HALF_UP):
+    return round_half(np.asarray(dollars, dtype=np.float64) * 100.0, rounding)
+
+
+def to_dollars(cents):
+    return np.asarray(cents, dtype=np.int64) / 100.0
+
+
+def divide_cents(cents, divisor, rounding=HALF_UP):
+    """Exact cents / divisor (divisor > 0) rounded to whole cents, without going through floats."""
+    _check_rounding(rounding)
+    quotient, remainder = np.divmod(np.asarray(cents, dtype=np.int64), np.asarray(divisor, dtype=np.int64))
+    twice = 2 * remainder
+    tie = twice == divisor
+    if rounding == HALF_UP:
+        # divmod floors, so a negative tie is already rounded away from zero
+        tie &= quotient >= 0
+    else:
+        tie &= quotient % 2 == 1
+    return quotient + ((twice > divisor) | tie)
+
+
+def _interest(opening, rate, accrual, basis_denominator, rounding):
+    # opening is in cents, so the product is already in cents
+    return round_half(opening * rate * accrual / basis_denominator, rounding)
+
+
+def _last_period(shape, counts):
+    return np.arange(shape[0])[:, None] == np.asarray(counts)[None, :] - 1
+
+
+def _finish(opening, interest, principal, counts, plug):
+    if plug:
+        last = _last_period(opening.shape, counts)
+        principal = np.where(last, opening, principal)
+    return opening, interest + principal, principal
+
+
+@timed("mortgage_cents")
+def mortgage_cents(notional, payment, rate, days, basis_denominator, counts, rounding=HALF_UP, plug=True):
+    """Level-payment schedule in cents; returns (opening balance, payment, principal).
+
+    `notional` and `payment` are int64 cents per loan. Interest accrues on
+    actual `days`, as in create_mortgage_style_amort.
+    """
+    opening = np.empty(days.shape, dtype=np.int64)
+    interest = np.empty(days.shape, dtype=np.int64)
+    balance = np.array(notional, dtype=np.int64, copy=True)
+    for i in range(days.shape[0]):
+        opening[i] = balance
+        interest[i] = _interest(balance, rate, days[i], basis_denominator, rounding)
+        balance = balance - (payment - interest[i])
+    return _finish(opening, interest, payment - interest, counts, plug)
+
+
+def block_average_cents(principal, counts, rows_per_block, rounding=HALF_UP):
+    """Per-row average of each loan's `rows_per_block`-row blocks, in whole cents.
+
+    Sums are exact integers, so one running sum serves every block and loan.
+    """
+    rows = principal.shape[0]
+    row = np.arange(rows)[:, None]
+    block_start = row // rows_per_block * rows_per_block
+    block_end = np.minimum(block_start + rows_per_block, counts)
+    running = np.zeros((rows + 1,) + principal.shape[1:], dtype=np.int64)
+    in_use = row < counts
+    np.cumsum(np.where(in_use, principal, 0), axis=0, out=running[1:])
+    block_end = np.where(in_use, block_end, block_start + 1)
+    sums = np.take_along_axis(running, block_end, axis=0) - np.take_along_axis(running, block_start, axis=0)
+    return divide_cents(sums, block_end - block_start, rounding)
+
+
+@timed("hybrid_cents")
+def hybrid_cents(notional, mortgage_principal, rate, days, basis_denominator, counts, rows_per_block,
+                 rounding=HALF_UP, plug=True):
+    """Hybrid schedule in cents: the mortgage principal averaged per year of periods."""
+    principal = block_average_cents(mortgage_principal, counts, rows_per_block, rounding)
+    opening = notional - (np.cumsum(principal, axis=0) - principal)
+    interest = _interest(opening, rate, days, basis_denominator, rounding)
+    return _finish(opening, interest, principal, counts, plug)
+
+
+@timed("straight_line_cents")
+def straight_line_cents(notional, num_periods, rate, accrual, basis_denominator, counts, rounding=HALF_UP,
+                        plug=True):
+    """Straight-line schedule in cents: equal principal of notional / num_periods, rounded once."""
+    period_principal = divide_cents(notional, num_periods, rounding)
+    principal = np.broadcast_to(period_principal, accrual.shape)
+    opening = notional - np.arange(accrual.shape[0])[:, None] * period_principal
+    interest = _interest(opening, rate, accrual, basis_denominator, rounding)
+    return _finish(opening, interest, principal, counts, plug)
@@ -7,10 +7,19 @@ Created on Wed Sep  6 12:10:43 2023
 
 
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime
+from business_calendar import FOLLOWING, get_calendar
+from instrumentation import count, timed
+from servicing import apply_mortgage_events
+from schedule_engine import ScheduleIndex, mortgage_style_schedule, hybrid_style_schedule, format_dates, to_day
 
 class MortgageStyle:
-    def __init__(self, settlement_date, maturity_date, first_payment_date, notional_amount, rate, basis_numerator, basis_denominator, amortization_years, payment_frequency):
+    # Terms live in slots rather than a per-instance __dict__
+    __slots__ = ("settlement_date", "maturity_date", "first_payment_date", "notional_amount", "rate",
+                 "basis_numerator", "basis_denominator", "amortization_years", "payment_frequency", "calendar",
+                 "business_day_convention", "num_periods", "period_payment", "_query_indexes")
+
+    def __init__(self, settlement_date, maturity_date, first_payment_date, notional_amount, rate, basis_numerator, basis_denominator, amortization_years, payment_frequency, calendar=None, business_day_convention=FOLLOWING):
         
         if isinstance(settlement_date, str):
             self.settlement_date = datetime.strptime(settlement_date, "%m/%d/%Y")
@@ -33,6 +42,9 @@ class MortgageStyle:
         self.basis_denominator = basis_denominator
         self.amortization_years = amortization_years
         self.payment_frequency = payment_frequency
+        self.calendar = get_calendar(calendar)
+        self.business_day_convention = business_day_convention
+        self._query_indexes = {}
         
         if self.payment_frequency == "1M":
             self.num_periods = self.amortization_years * 12
@@ -64,86 +76,80 @@ class MortgageStyle:
         else:
             return days / 365.0 * 360.0
 
-    def _get_next_dates(self, current_date):
-        if current_date == self.settlement_date:
-            return self.first_payment_date, self.first_payment_date
-        
-        # Determine the month increment based on payment_frequency
-        if self.payment_frequency == "1M":
-            months_increment = 1
-        elif self.payment_frequency == "3M":
-            months_increment = 3
-        elif self.payment_frequency == "6M":
-            months_increment = 6
-            
-        next_month = (current_date.month + months_increment - 1) % 12 + 1
-        next_year = current_date.year + (current_date.month - 1 + months_increment) // 12
-        
-        period_end_date = current_date.replace(year=next_year, month=next_month, day=self.first_payment_date.day)
-
-        payment_date = period_end_date
-        # If it's a weekend, move to the next business day for payment date
-        while payment_date.weekday() >= 5:
-            payment_date += timedelta(days=1)
-
-        return period_end_date, payment_date
-
     def create_mortgage_style_amort(self):
-        data = []
-        current_date = self.settlement_date
-        payment_number = 1
-        notional_amount = self.notional_amount
-
-        while current_date < self.maturity_date and payment_number <= self.num_periods:
-            period_start_date = current_date
-            period_end_date, payment_date = self._get_next_dates(current_date)
-            days_in_period = self._compute_days(period_start_date, period_end_date)
-            days_in_period = (period_end_date - period_start_date).days
-            interest_for_period = (notional_amount * self.rate * days_in_period) / self.basis_denominator
-            period_principal_payment = round(self.period_payment - interest_for_period, 2)  # Rounding to the nearest cent here
-            notional_amount -= period_principal_payment
-
-            data.append([period_start_date, period_end_date, payment_date, payment_number, notional_amount + period_principal_payment, self.period_payment, period_principal_payment, days_in_period])
-
-            current_date = period_end_date
-            payment_number += 1
-            
-            
-        # Convert dates in data list to day, month, and year format
-        for row in data:
-            row[0] = row[0].strftime('%m/%d/%Y')
-            row[1] = row[1].strftime('%m/%d/%Y')
-            row[2] = row[2].strftime('%m/%d/%Y')
-
-        
-        df = pd.DataFrame(data, columns=["Period Start Date", "Period End Date", "Payment Date", "Payment Number", "Outstanding Balance", "Period Payment", "Principal Payment", "Days in Period"])
+        schedule = mortgage_style_schedule(self.settlement_date, self.maturity_date, self.first_payment_date,
+                                           self.notional_amount, self.rate, self.basis_denominator,
+                                           self.payment_frequency, self.num_periods, self.period_payment,
+                                           self.calendar, self.business_day_convention)
+        return self._schedule_frame(schedule)
+
+    @timed("schedule_frame")
+    def _schedule_frame(self, schedule):
+        # Dates are formatted as month/day/year only at the DataFrame edge
+        count("schedules")
+        count("schedule_periods", len(schedule["days"]))
+        df = pd.DataFrame({
+            "Period Start Date": format_dates(schedule["period_start"]),
+            "Period End Date": format_dates(schedule["period_end"]),
+            "Payment Date": format_dates(schedule["payment_date"]),
+            "Payment Number": schedule["payment_number"],
+            "Outstanding Balance": schedule["outstanding_balance"],
+            "Period Payment": schedule["period_payment"],
+            "Principal Payment": schedule["principal_payment"],
+            "Days in Period": schedule["days"],
+        })
         return df
 
     def create_hybrid_style_amort(self):
-        mortgage_df = self.create_mortgage_style_amort()
-
-        # Split the mortgage_df into yearly segments
-        dfs = [mortgage_df.iloc[i:i+12] for i in range(0, len(mortgage_df), 12)]
-
-        new_data = []
-        notional_amount_reset = self.notional_amount
-
-        for yearly_df in dfs:
-            avg_principal_payment = yearly_df['Principal Payment'].mean()
-            avg_principal_payment = round(avg_principal_payment, 2)  # Round to 2 decimal places
-            for _, row in yearly_df.iterrows():
-                interest_for_period = (notional_amount_reset * self.rate * row['Days in Period']) / self.basis_denominator
-                period_payment_adjusted = interest_for_period + avg_principal_payment
-                notional_amount_reset -= avg_principal_payment
-
-                new_data.append([row['Period Start Date'], row['Period End Date'], row['Payment Date'], row['Payment Number'], notional_amount_reset + avg_principal_payment, period_payment_adjusted, avg_principal_payment, row['Days in Period']])
-      
-        
-        df_new = pd.DataFrame(new_data, columns=["Period Start Date", "Period End Date", "Payment Date", "Payment Number", "Outstanding Balance", "Period Payment", "Principal Payment", "Days in Period"])
-        return df_new
+        # Yearly average principal: 12, 4 or 2 periods per year for 1M, 3M and 6M
+        schedule = hybrid_style_schedule(self.settlement_date, self.maturity_date, self.first_payment_date,
+                                         self.notional_amount, self.rate, self.basis_denominator,
+                                         self.payment_frequency, self.num_periods, self.period_payment,
+                                         self.calendar, self.business_day_convention)
+        return self._schedule_frame(schedule)
+
+    def _query_index(self, hybrid):
+        # One array pass per style, reused by every query on this loan
+        index = self._query_indexes.get(hybrid)
+        if index is None:
+            build = hybrid_style_schedule if hybrid else mortgage_style_schedule
+            schedule = build(self.settlement_date, self.maturity_date, self.first_payment_date, self.notional_amount,
+                             self.rate, self.basis_denominator, self.payment_frequency, self.num_periods,
+                             self.period_payment, self.calendar, self.business_day_convention)
+            index = self._query_indexes[hybrid] = ScheduleIndex(schedule, self.notional_amount)
+        return index
+
+    def level_payment(self):
+        return self.period_payment
+
+    def balance_at(self, date, hybrid=False):
+        """Outstanding balance after every payment whose period ends on or before `date`."""
+        return self._query_index(hybrid).balance_at(date)
+
+    def cumulative_interest(self, start_date=None, end_date=None, hybrid=False):
+        """Total interest of the periods ending between start_date and end_date (inclusive)."""
+        return self._query_index(hybrid).interest_between(start_date, end_date)
+
+    def payoff_amount(self, date, hybrid=False):
+        """Balance at `date` plus interest accrued on actual days since the last period end."""
+        index = self._query_index(hybrid)
+        balance = index.balance_at(date)
+        # The schedule's own accrual: actual days over the denominator, whatever the numerator
+        days = int((to_day(date) - index.last_period_end(date, self.settlement_date)).astype(int))
+        return round(balance + (balance * self.rate * days) / self.basis_denominator, 2)
+
+    def apply_events(self, schedule, *events):
+        """Apply Prepayment, RateChange or Reamortization events to a schedule from this loan.
+
+        Rows before the first event are reused; only the tail is recomputed.
+        Works on create_mortgage_style_amort output.
+        """
+        return apply_mortgage_events(schedule, events, self.rate, self.basis_numerator, self.basis_denominator,
+                                     self.payment_frequency, self.num_periods)
     
     
-mortgage = MortgageStyle("8/1/2023", "8/1/2032", "9/1/2023", 600000, 7.03, "ACT", 360, 25, payment_frequency="1M")
-amortization_schedule = mortgage.create_mortgage_style_amort()
-hybrid_schedule = mortgage.create_hybrid_style_amort()
-print(amortization_schedule)
+if __name__ == "__main__":
+    mortgage = MortgageStyle("8/1/2023", "8/1/2032", "9/1/2023", 600000, 7.03, "ACT", 360, 25, payment_frequency="1M")
+    amortization_schedule = mortgage.create_mortgage_style_amort()
+    hybrid_schedule = mortgage.create_hybrid_style_amort()
+    print(amortization_schedule)
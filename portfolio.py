@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+"""
+Batch amortization for a whole loan book in one call.
+
+amortize_portfolio takes a table of loan terms (a DataFrame or a mapping of
+column name -> sequence) and returns a single long-format, struct-of-arrays
+PortfolioSchedule keyed by loan id instead of one DataFrame per loan. Loans are
+processed in chunks; within a chunk every loan of a style steps through the
+schedule together as (periods x loans) arrays.
+"""
+
+import numpy as np
+import pandas as pd
+
+from business_calendar import FOLLOWING
+from instrumentation import count, timed
+from money import CENTS, FLOAT, HALF_UP, MONEY_MODES, hybrid_cents, mortgage_cents, straight_line_cents, to_cents, \
+    to_dollars
+from schedule_engine import (MONTHS_PER_PERIOD, PERIODS_PER_YEAR, basis_days, block_means, date_grids,
+                             hybrid_balances, level_payment, mortgage_balances, round_cents, to_day, to_days)
+
+
+MORTGAGE_STYLE = "Mortgage Style"
+HYBRID_STYLE = "Hybrid Style"
+STRAIGHT_LINE = "Straight Line"
+STYLES = (MORTGAGE_STYLE, HYBRID_STYLE, STRAIGHT_LINE)
+
+LOAN_TERMS = ("settlement_date", "maturity_date", "first_payment_date", "notional_amount", "rate",
+              "basis_numerator", "basis_denominator", "amortization_years", "payment_frequency", "style")
+
+SCHEDULE_FIELDS = ("loan_id", "payment_number", "period_start", "period_end", "payment_date",
+                   "outstanding_balance", "period_payment", "principal_payment", "days")
+MONEY_FIELDS = ("outstanding_balance", "period_payment", "principal_payment")
+
+# Column labels used by the single-loan DataFrames, for to_frame()
+FRAME_COLUMNS = {
+    "loan_id": "Loan ID",
+    "period_start": "Period Start Date",
+    "period_end": "Period End Date",
+    "payment_date": "Payment Date",
+    "payment_number": "Payment Number",
+    "outstanding_balance": "Outstanding Balance",
+    "period_payment": "Period Payment",
+    "principal_payment": "Principal Payment",
+    "days": "Days in Period",
+}
+
+
+class LoanTerms:
+    """One loan's terms as a slotted record (no per-instance __dict__).
+
+    A sequence of LoanTerms is accepted anywhere a loan table is.
+    """
+
+    __slots__ = LOAN_TERMS + ("loan_id",)
+
+    def __init__(self, settlement_date, maturity_date, first_payment_date, notional_amount, rate, basis_numerator,
+                 basis_denominator, amortization_years, payment_frequency, style=MORTGAGE_STYLE, loan_id=None):
+        self.settlement_date = settlement_date
+        self.maturity_date = maturity_date
+        self.first_payment_date = first_payment_date
+        self.notional_amount = notional_amount
+        self.rate = rate
+        self.basis_numerator = basis_numerator
+        self.basis_denominator = basis_denominator
+        self.amortization_years = amortization_years
+        self.payment_frequency = payment_frequency
+        self.style = style
+        self.loan_id = loan_id
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"LoanTerms({fields})"
+
+
+def loan_columns(loans):
+    """Column mapping for a loan table given as a DataFrame, a mapping of columns or a sequence of LoanTerms."""
+    if isinstance(loans, pd.DataFrame):
+        return {column: loans[column].to_numpy() for column in loans.columns}
+    if hasattr(loans, "keys"):
+        return loans
+    loans = list(loans)
+    columns = {name: [getattr(loan, name) for loan in loans] for name in LOAN_TERMS}
+    if any(loan.loan_id is not None for loan in loans):
+        columns["loan_id"] = [i if loan.loan_id is None else loan.loan_id for i, loan in enumerate(loans)]
+    return columns
+
+
+class PortfolioSchedule:
+    """Long-format schedule for many loans held as one typed array per column.
+
+    Rows are grouped by loan in input order; the rows of loan i are
+    columns[...][offsets[i]:offsets[i + 1]]. Dates are datetime64[D], payment
+    numbers and day counts int32. Money columns are float64 dollars, or int64
+    cents when `money` is CENTS; amounts() always gives dollars.
+    """
+
+    def __init__(self, loan_ids, offsets, columns, money=FLOAT):
+        self.loan_ids = loan_ids
+        self.offsets = offsets
+        self.columns = columns
+        self.money = money
+        self._positions = None
+        self._end_keys = None
+
+    def __len__(self):
+        return len(self.columns["payment_number"])
+
+    def __getitem__(self, field):
+        return self.columns[field]
+
+    def amounts(self, field):
+        # A money column in dollars whatever the money mode
+        values = self.columns[field]
+        return to_dollars(values) if self.money == CENTS else values
+
+    @property
+    def nbytes(self):
+        return sum(values.nbytes for values in self.columns.values()) + self.loan_ids.nbytes + self.offsets.nbytes
+
+    def copy(self):
+        return PortfolioSchedule(self.loan_ids.copy(), self.offsets.copy(),
+                                 {field: values.copy() for field, values in self.columns.items()}, self.money)
+
+    def loan(self, loan_id):
+        # Column slices (views) for a single loan
+        if self._positions is None:
+            self._positions = {key: i for i, key in enumerate(self.loan_ids.tolist())}
+        i = self._positions[loan_id]
+        start, stop = self.offsets[i], self.offsets[i + 1]
+        return {field: values[start:stop] for field, values in self.columns.items()}
+
+    def balance_at(self, date):
+        """Every loan's balance (in dollars) after its payments with period end on or before `date`.
+
+        Loans without periods give NaN. One binary search covers the whole book.
+        """
+        counts = np.diff(self.offsets)
+        if self._end_keys is None:
+            # Rows are grouped by loan with period ends ascending, so (loan, end) keys are sorted
+            loan_index = np.repeat(np.arange(len(counts), dtype=np.int64), counts)
+            self._end_keys = (loan_index << 32) + self.columns["period_end"].astype(np.int64)
+        day = to_day(date).astype(np.int64)
+        position = np.searchsorted(self._end_keys, (np.arange(len(counts), dtype=np.int64) << 32) + day,
+                                   side="right")
+        opening = self.amounts("outstanding_balance")
+        principal = self.amounts("principal_payment")
+        paid = position > self.offsets[:-1]
+        last = np.maximum(position - 1, 0)
+        balances = np.full(len(counts), np.nan)
+        has_rows = counts > 0
+        balances[has_rows] = opening[self.offsets[:-1][has_rows]]
+        balances[paid] = opening[last[paid]] - principal[last[paid]]
+        return balances
+
+    def to_frame(self, start=None, stop=None):
+        # Rows start:stop only, so large books can be written out a slice at a time
+        frame = {}
+        for field in SCHEDULE_FIELDS:
+            values = self.columns[field][start:stop]
+            frame[FRAME_COLUMNS[field]] = to_dollars(values) if field in MONEY_FIELDS and self.money == CENTS else values
+        return pd.DataFrame(frame)
+
+
+def _loan_table(loans):
+    loans = loan_columns(loans)
+    missing = [term for term in LOAN_TERMS if term not in loans]
+    if missing:
+        raise ValueError(f"Loan table is missing columns: {', '.join(missing)}")
+
+    table = {
+        "settlement_date": to_days(loans["settlement_date"]),
+        "maturity_date": to_days(loans["maturity_date"]),
+        "first_payment_date": to_days(loans["first_payment_date"]),
+        "notional_amount": np.asarray(loans["notional_amount"], dtype=np.float64),
+        # Rates are quoted in percent, as for MortgageStyle/StraightLineAmortization
+        "rate": np.asarray(loans["rate"], dtype=np.float64) / 100,
+        "basis_numerator": np.asarray(loans["basis_numerator"]).astype(str),
+        "basis_denominator": np.asarray(loans["basis_denominator"], dtype=np.int64),
+        "amortization_years": np.asarray(loans["amortization_years"], dtype=np.int64),
+        "payment_frequency": np.asarray(loans["payment_frequency"]).astype(str),
+        "style": np.asarray(loans["style"]).astype(str),
+    }
+    count = len(table["settlement_date"])
+    table["loan_id"] = np.asarray(loans["loan_id"]) if "loan_id" in loans else np.arange(count)
+
+    unknown = sorted(set(table["payment_frequency"]) - set(PERIODS_PER_YEAR))
+    if unknown:
+        raise ValueError(f"Unknown payment frequency: {', '.join(unknown)}")
+    unknown = sorted(set(table["style"]) - set(STYLES))
+    if unknown:
+        raise ValueError(f"Unknown amortization style: {', '.join(unknown)}")
+    return table
+
+
+def _lookup(mapping, keys):
+    values = np.empty(len(keys), dtype=np.int64)
+    for key, value in mapping.items():
+        values[keys == key] = value
+    return values
+
+
+def _level_payment(terms, settlement, first_payment, rounded=True):
+    periods_per_year = _lookup(PERIODS_PER_YEAR, terms["payment_frequency"])
+    days_in_first_period = (first_payment - settlement).astype(np.int64)
+    period_payment = level_payment(terms["notional_amount"], terms["rate"], days_in_first_period,
+                                   terms["basis_numerator"], terms["basis_denominator"],
+                                   terms["amortization_years"], periods_per_year, rounded)
+    if not np.all(np.isfinite(period_payment)):
+        raise ZeroDivisionError("float division by zero computing the level payment "
+                                f"for loans {terms['loan_id'][~np.isfinite(period_payment)].tolist()}")
+    return period_payment
+
+
+def _mortgage_columns(terms, days, settlement, first_payment):
+    period_payment = _level_payment(terms, settlement, first_payment)
+    opening, principal = mortgage_balances(terms["notional_amount"], period_payment, terms["rate"],
+                                           days, terms["basis_denominator"])
+    return opening, np.broadcast_to(period_payment, days.shape), principal
+
+
+def _hybrid_columns(terms, days, counts, settlement, first_payment):
+    _, _, mortgage_principal = _mortgage_columns(terms, days, settlement, first_payment)
+    # create_hybrid_style_amort averages principal over each year of periods
+    rows_per_block = _lookup(PERIODS_PER_YEAR, terms["payment_frequency"])
+    principal = np.round(block_means(mortgage_principal, counts, rows_per_block), 2)
+    return hybrid_balances(terms["notional_amount"], principal, terms["rate"], days,
+                           terms["basis_denominator"]) + (principal,)
+
+
+def _accrual(terms, days):
+    # compute_days: "30" accrues 30 days a period, and a 365 denominator rescales to 360
+    accrual = np.where(terms["basis_numerator"] == "ACT", days, 30)
+    return basis_days(accrual, terms["basis_denominator"])
+
+
+def _straight_line_columns(terms, days):
+    num_periods = terms["amortization_years"] * _lookup(PERIODS_PER_YEAR, terms["payment_frequency"])
+    period_principal_payment = terms["notional_amount"] / num_periods
+
+    steps = np.empty((days.shape[0] + 1, days.shape[1]), dtype=np.float64)
+    steps[0] = terms["notional_amount"]
+    steps[1:] = -period_principal_payment
+    balances = np.cumsum(steps, axis=0)
+
+    interest_for_period = (balances[:-1] * terms["rate"] * _accrual(terms, days)) / terms["basis_denominator"]
+    payment = round_cents(interest_for_period + period_principal_payment)
+    principal = np.broadcast_to(period_principal_payment, days.shape)
+    return balances[1:] + period_principal_payment, payment, principal
+
+
+def _cents_columns(style, terms, days, counts, settlement, first_payment, rounding):
+    notional = to_cents(terms["notional_amount"], rounding)
+    if style == STRAIGHT_LINE:
+        num_periods = terms["amortization_years"] * _lookup(PERIODS_PER_YEAR, terms["payment_frequency"])
+        return straight_line_cents(notional, num_periods, terms["rate"], _accrual(terms, days),
+                                   terms["basis_denominator"], counts, rounding)
+    payment = to_cents(_level_payment(terms, settlement, first_payment, rounded=False), rounding)
+    if style == MORTGAGE_STYLE:
+        return mortgage_cents(notional, payment, terms["rate"], days, terms["basis_denominator"], counts, rounding)
+    _, _, mortgage_principal = mortgage_cents(notional, payment, terms["rate"], days, terms["basis_denominator"],
+                                              counts, rounding, plug=False)
+    return hybrid_cents(notional, mortgage_principal, terms["rate"], days, terms["basis_denominator"], counts,
+                        _lookup(PERIODS_PER_YEAR, terms["payment_frequency"]), rounding)
+
+
+@timed("portfolio_chunk")
+def _amortize_chunk(table, index, calendar=None, convention=FOLLOWING, money=FLOAT, rounding=HALF_UP):
+    terms = {name: values[index] for name, values in table.items()}
+    count("portfolio_loans", len(index))
+    num_periods = terms["amortization_years"] * _lookup(PERIODS_PER_YEAR, terms["payment_frequency"])
+    starts, ends, payment_dates, counts, bad_day = date_grids(
+        terms["settlement_date"], terms["maturity_date"], terms["first_payment_date"],
+        _lookup(MONTHS_PER_PERIOD, terms["payment_frequency"]), num_periods, calendar, convention)
+    if bad_day.any():
+        raise ValueError(f"day is out of range for month for loans {terms['loan_id'][bad_day].tolist()}")
+    days = (ends - starts).astype(np.int64)
+
+    money_dtype = np.int64 if money == CENTS else np.float64
+    balance = np.zeros(days.shape, dtype=money_dtype)
+    payment = np.zeros(days.shape, dtype=money_dtype)
+    principal = np.zeros(days.shape, dtype=money_dtype)
+    for style in STYLES:
+        members = np.flatnonzero(terms["style"] == style)
+        if not len(members):
+            continue
+        sub = {name: values[members] for name, values in terms.items()}
+        rows = int(counts[members].max(initial=0))
+        sub_days = days[:rows, members]
+        if money == CENTS:
+            columns = _cents_columns(style, sub, sub_days, counts[members], sub["settlement_date"],
+                                     sub["first_payment_date"], rounding)
+        elif style == STRAIGHT_LINE:
+            columns = _straight_line_columns(sub, sub_days)
+        elif style == MORTGAGE_STYLE:
+            columns = _mortgage_columns(sub, sub_days, sub["settlement_date"], sub["first_payment_date"])
+        else:
+            columns = _hybrid_columns(sub, sub_days, counts[members], sub["settlement_date"],
+                                      sub["first_payment_date"])
+        for target, values in zip((balance, payment, principal), columns):
+            target[:rows, members] = values
+
+    # Flatten loan-major so each loan's rows are contiguous and in input order
+    in_schedule = (np.arange(days.shape[0])[:, None] < counts).T
+    period_number = np.broadcast_to(np.arange(1, days.shape[0] + 1, dtype=np.int32)[:, None], days.shape)
+    columns = {
+        "loan_id": np.repeat(terms["loan_id"], counts),
+        "payment_number": period_number.T[in_schedule],
+        "period_start": starts.T[in_schedule],
+        "period_end": ends.T[in_schedule],
+        "payment_date": payment_dates.T[in_schedule],
+        "outstanding_balance": balance.T[in_schedule],
+        "period_payment": payment.T[in_schedule],
+        "principal_payment": principal.T[in_schedule],
+        "days": days.T[in_schedule].astype(np.int32),
+    }
+    return counts, columns
+
+
+def amortize_portfolio(loans, chunk_size=10000, calendar=None, convention=FOLLOWING, cache=None, money=CENTS,
+                       rounding=HALF_UP):
+    """Amortize every loan in `loans` and return one PortfolioSchedule.
+
+    `loans` (see loan_columns) needs the LOAN_TERMS columns (the MortgageStyle
+    constructor arguments plus `style`, one of STYLES) and may carry a
+    `loan_id` column. Rates are in percent. Payment dates are adjusted on
+    `calendar` (a BusinessCalendar or built-in calendar name; weekends only by
+    default) using `convention`.
+
+    By default money is carried in int64 cents (see money.py): interest is
+    rounded with `rounding` (HALF_UP or HALF_EVEN) and the last period pays
+    off the remaining balance. With money=FLOAT each loan's rows match the
+    corresponding single-loan method to the cent instead. With a ScheduleCache
+    as `cache`, a book that was already amortized with the same terms is
+    returned from it.
+    """
+    if money not in MONEY_MODES:
+        raise ValueError(f"Unknown money mode: {money}")
+    if cache is not None:
+        return cache.get_or_compute(("amortize_portfolio", loans, calendar, convention, money, rounding),
+                                    lambda: amortize_portfolio(loans, chunk_size, calendar, convention,
+                                                               money=money, rounding=rounding))
+    table = _loan_table(loans)
+    total = len(table["loan_id"])
+    counts = []
+    pieces = []
+    for lo in range(0, total, chunk_size):
+        chunk_counts, columns = _amortize_chunk(table, np.arange(lo, min(lo + chunk_size, total)), calendar,
+                                                convention, money, rounding)
+        counts.append(chunk_counts)
+        pieces.append(columns)
+
+    offsets = np.zeros(total + 1, dtype=np.int64)
+    if counts:
+        np.cumsum(np.concatenate(counts), out=offsets[1:])
+        columns = {field: np.concatenate([piece[field] for piece in pieces]) for field in SCHEDULE_FIELDS}
+    else:
+        columns = _amortize_chunk(table, np.arange(0), money=money)[1]
+    return PortfolioSchedule(table["loan_id"], offsets, columns, money)
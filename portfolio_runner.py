@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Multi-process runner for large loan books.
+
+The book is cut into fixed-size chunks that are farmed out to a
+concurrent.futures process pool. Each worker runs the regular MortgageStyle /
+StraightLineAmortization methods for its loans and ships back compact NumPy
+columns rather than pickled DataFrames. Chunks are merged in input order, so the
+result is identical whatever the worker count.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from business_calendar import FOLLOWING
+from mortgagestyle_v2 import MortgageStyle
+from portfolio import (HYBRID_STYLE, LOAN_TERMS, MORTGAGE_STYLE, SCHEDULE_FIELDS, STRAIGHT_LINE,
+                       PortfolioSchedule, loan_columns)
+from schedule_engine import to_days
+from straightline_v2 import StraightLineAmortization
+
+
+CONSTRUCTOR_TERMS = LOAN_TERMS[:-1]
+DATE_FIELDS = ("period_start", "period_end", "payment_date")
+# Schedule columns in DataFrame order, after loan_id
+FIELD_DTYPES = {
+    "period_start": "datetime64[D]",
+    "period_end": "datetime64[D]",
+    "payment_date": "datetime64[D]",
+    "payment_number": np.int32,
+    "outstanding_balance": np.float64,
+    "period_payment": np.float64,
+    "principal_payment": np.float64,
+    "days": np.int32,
+}
+
+
+def _generate(terms, calendar, convention):
+    style = terms["style"]
+    args = [terms[name] for name in CONSTRUCTOR_TERMS]
+    if style == STRAIGHT_LINE:
+        return StraightLineAmortization(*args, calendar, convention).generate_schedule()
+    if style == MORTGAGE_STYLE:
+        return MortgageStyle(*args, calendar, convention).create_mortgage_style_amort()
+    if style == HYBRID_STYLE:
+        return MortgageStyle(*args, calendar, convention).create_hybrid_style_amort()
+    raise ValueError(f"Unknown amortization style: {style}")
+
+
+def amortize_chunk(chunk, calendar=None, convention=FOLLOWING):
+    """Worker entry point: schedule every loan in `chunk` and return (counts, columns).
+
+    `chunk` maps each LOAN_TERMS name to a list of values, with dates as
+    datetime.date, plus a loan_id array. Columns come back as plain arrays in
+    loan order.
+    """
+    count = len(chunk["loan_id"])
+    counts = np.zeros(count, dtype=np.int64)
+    pieces = {field: [np.empty(0, dtype=dtype)] for field, dtype in FIELD_DTYPES.items()}
+    for i in range(count):
+        df = _generate({name: values[i] for name, values in chunk.items()}, calendar, convention)
+        counts[i] = len(df)
+        # Mortgage and hybrid schedules carry "%m/%d/%Y" strings, straight-line carries dates
+        date_format = None if chunk["style"][i] == STRAIGHT_LINE else "%m/%d/%Y"
+        # Columns are taken by position: straight-line labels its day count differently
+        for position, (field, dtype) in enumerate(FIELD_DTYPES.items()):
+            values = df.iloc[:, position]
+            if field in DATE_FIELDS:
+                values = pd.to_datetime(values, format=date_format)
+            pieces[field].append(values.to_numpy().astype(dtype))
+
+    columns = {"loan_id": np.repeat(np.asarray(chunk["loan_id"]), counts)}
+    for field in FIELD_DTYPES:
+        columns[field] = np.concatenate(pieces[field])
+    return counts, columns
+
+
+def _chunks(loans, chunk_size):
+    loans = loan_columns(loans)
+    missing = [term for term in LOAN_TERMS if term not in loans]
+    if missing:
+        raise ValueError(f"Loan table is missing columns: {', '.join(missing)}")
+
+    total = len(loans["settlement_date"])
+    table = {name: np.asarray(loans[name]) for name in LOAN_TERMS}
+    for name in ("settlement_date", "maturity_date", "first_payment_date"):
+        table[name] = to_days(table[name]).astype(object)
+    table["loan_id"] = np.asarray(loans["loan_id"]) if "loan_id" in loans else np.arange(total)
+
+    for lo in range(0, total, chunk_size):
+        # Terms go over as Python scalars so the classes see the same types as a direct call
+        chunk = {name: table[name][lo:lo + chunk_size].tolist() for name in LOAN_TERMS}
+        chunk["loan_id"] = table["loan_id"][lo:lo + chunk_size]
+        yield chunk
+
+
+def run_portfolio(loans, workers=None, chunk_size=500, calendar=None, convention=FOLLOWING, cache=None):
+    """Amortize `loans` across a process pool and return one PortfolioSchedule.
+
+    `loans` is the same table amortize_portfolio takes. `workers` defaults to
+    os.cpu_count(); with workers=1 everything runs in this process. Output does
+    not depend on `workers` or on scheduling order. `calendar` and
+    `convention` are passed to every loan; `cache` is an optional
+    ScheduleCache, as for amortize_portfolio.
+    """
+    if cache is not None:
+        return cache.get_or_compute(("run_portfolio", loans, calendar, convention),
+                                    lambda: run_portfolio(loans, workers, chunk_size, calendar, convention))
+    workers = workers or os.cpu_count() or 1
+    chunks = list(_chunks(loans, chunk_size))
+    # Built-in calendars pickle by name, so workers use their own precomputed copies
+    worker = partial(amortize_chunk, calendar=calendar, convention=convention)
+    if workers == 1 or len(chunks) <= 1:
+        results = [worker(chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # map yields results in submission order, which makes the merge deterministic
+            results = list(executor.map(worker, chunks))
+
+    loan_ids = np.concatenate([np.asarray(chunk["loan_id"]) for chunk in chunks]) if chunks else np.arange(0)
+    offsets = np.zeros(len(loan_ids) + 1, dtype=np.int64)
+    if results:
+        np.cumsum(np.concatenate([counts for counts, _ in results]), out=offsets[1:])
+        columns = {field: np.concatenate([piece[field] for _, piece in results]) for field in SCHEDULE_FIELDS}
+    else:
+        columns = worker(dict({name: [] for name in LOAN_TERMS}, loan_id=loan_ids))[1]
+    return PortfolioSchedule(loan_ids, offsets, columns)
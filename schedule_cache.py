@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Memoized amortization schedules.
+
+ScheduleCache keeps finished schedules under a SHA-256 of their inputs (loan
+terms, calendar, and the forward curve's knots for floating-rate schedules)
+and evicts least recently used entries once either the entry or the byte
+budget is exceeded. Callers always get their own copy, so cached schedules
+can't be changed from outside. A cache is safe to share between threads, such
+as Streamlit sessions.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from business_calendar import FOLLOWING, BusinessCalendar
+from floating_rate import apply_floating_rate
+from forward_curve import ForwardCurve
+from instrumentation import count
+from mortgagestyle_v2 import MortgageStyle
+from portfolio import HYBRID_STYLE, MORTGAGE_STYLE, STRAIGHT_LINE, LoanTerms
+from straightline_v2 import StraightLineAmortization
+
+
+def _update(digest, kind, payload):
+    # Length-prefixed so neighbouring parts can never run together
+    digest.update(f"{kind}:{len(payload)}:".encode())
+    digest.update(payload)
+
+
+def _feed(digest, value):
+    if isinstance(value, ForwardCurve):
+        # Curves are identified by what they evaluate to, not by object identity
+        _feed(digest, ("ForwardCurve", value.method, value.start, value.x, value.y))
+    elif isinstance(value, LoanTerms):
+        _feed(digest, ("LoanTerms",) + tuple(getattr(value, name) for name in LoanTerms.__slots__))
+    elif isinstance(value, BusinessCalendar):
+        _feed(digest, ("BusinessCalendar", value.name, value.weekmask, value.holidays))
+    elif isinstance(value, pd.DataFrame):
+        _feed(digest, ("DataFrame", list(value.columns)) +
+              tuple(value.iloc[:, i].to_numpy() for i in range(value.shape[1])))
+    elif isinstance(value, dict):
+        _feed(digest, ("dict",) + tuple(sorted(((str(k), v) for k, v in value.items()), key=lambda kv: kv[0])))
+    elif isinstance(value, (list, tuple)):
+        _update(digest, type(value).__name__, str(len(value)).encode())
+        for item in value:
+            _feed(digest, item)
+    elif isinstance(value, np.ndarray):
+        if value.dtype == object:
+            # Element types survive str(), so a date and a datetime still hash apart
+            data = pd.util.hash_array(value.reshape(-1), categorize=False).tobytes()
+        else:
+            data = np.ascontiguousarray(value).tobytes()
+        _update(digest, f"ndarray[{value.dtype.str}]{value.shape}", data)
+    elif value is None or isinstance(value, (str, int, float, date, pd.Timestamp, np.generic)):
+        # The type is part of the key: the classes treat int, float and numpy scalars differently
+        _update(digest, f"{type(value).__module__}.{type(value).__qualname__}", repr(value).encode())
+    else:
+        raise TypeError(f"Cannot build a cache key from {type(value).__name__}")
+
+
+def canonical_key(*parts):
+    """SHA-256 hex digest of `parts` (scalars, dates, arrays, DataFrames, curves, calendars)."""
+    digest = hashlib.sha256()
+    _feed(digest, parts)
+    return digest.hexdigest()
+
+
+def _nbytes(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    return int(getattr(value, "nbytes", 0))
+
+
+class ScheduleCache:
+    """LRU cache of schedules (DataFrames or PortfolioSchedules).
+
+    Entries are evicted oldest first once there are more than `max_entries`
+    or they hold more than `max_bytes`. hits, misses and evictions count
+    lookups since creation (or the last clear()).
+    """
+
+    def __init__(self, max_entries=256, max_bytes=256 * 2 ** 20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                count("schedule_cache_misses")
+                return None
+            self.hits += 1
+            count("schedule_cache_hits")
+            self._entries.move_to_end(key)
+            value = self._entries[key][0]
+        return value.copy()
+
+    def put(self, key, value):
+        size = _nbytes(value)
+        if size > self.max_bytes:
+            # Larger than the whole budget: hand it back uncached
+            return
+        value = value.copy()
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.nbytes += size
+            while len(self._entries) > self.max_entries or self.nbytes > self.max_bytes:
+                self.nbytes -= self._entries.popitem(last=False)[1][1]
+                self.evictions += 1
+
+    def get_or_compute(self, parts, compute):
+        """Return the cached value for canonical_key(*parts), calling `compute()` on a miss.
+
+        `compute()` runs outside the lock, so two threads missing on the same
+        key at once may both compute it; the later put() wins.
+        """
+        key = canonical_key(*parts)
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "nbytes": self.nbytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+
+_default_cache = None
+
+
+def default_cache():
+    # One cache per process, shared by every Streamlit session and rerun
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ScheduleCache()
+    return _default_cache
+
+
+def loan_schedule(style, settlement_date, maturity_date, first_payment_date, notional_amount, rate, basis_numerator,
+                  basis_denominator, amortization_years, payment_frequency, calendar=None, convention=FOLLOWING,
+                  curve=None, cache=None, **floating):
+    """Single-loan schedule DataFrame for `style`, served from `cache` when possible.
+
+    With a `curve` the schedule is repriced by apply_floating_rate using the
+    `floating` keyword arguments (spread, reset_frequency, lookback_days, cap,
+    floor). `cache=None` uses default_cache().
+    """
+    args = (settlement_date, maturity_date, first_payment_date, notional_amount, rate, basis_numerator,
+            basis_denominator, amortization_years, payment_frequency, calendar, convention)
+
+    def compute():
+        if style == MORTGAGE_STYLE:
+            df = MortgageStyle(*args).create_mortgage_style_amort()
+        elif style == HYBRID_STYLE:
+            df = MortgageStyle(*args).create_hybrid_style_amort()
+        elif style == STRAIGHT_LINE:
+            df = StraightLineAmortization(*args).generate_schedule()
+        else:
+            raise ValueError(f"Unknown amortization style: {style}")
+        if curve is not None:
+            df = apply_floating_rate(df, curve, basis_numerator=basis_numerator,
+                                     basis_denominator=basis_denominator, **floating)
+        return df
+
+    cache = cache if cache is not None else default_cache()
+    return cache.get_or_compute(("loan_schedule", style) + args + (curve, floating), compute)
@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+"""
+Array-based schedule engine used by MortgageStyle and StraightLineAmortization.
+
+The date grid, day counts, interest, principal and balance columns are built as
+whole NumPy arrays instead of one period at a time. Results match the original
+per-period loops to the cent, including Python's round(x, 2) semantics.
+"""
+
+from datetime import datetime
+
+import numpy as np
+
+from business_calendar import FOLLOWING, get_calendar, payment_grid
+from instrumentation import timed
+
+
+MONTHS_PER_PERIOD = {"1M": 1, "3M": 3, "6M": 6}
+PERIODS_PER_YEAR = {"1M": 12, "3M": 4, "6M": 2}
+_EPOCH_ORDINAL = datetime(1970, 1, 1).toordinal()
+
+
+def to_day(value):
+    # Accepts the same inputs as the loan classes: "%m/%d/%Y" strings, dates and datetimes
+    if isinstance(value, str):
+        value = datetime.strptime(value, "%m/%d/%Y")
+    if isinstance(value, datetime):
+        value = value.date()
+    return np.datetime64(value, "D")
+
+
+def to_days(values):
+    # Column form of to_day; a loan book repeats dates heavily, so each distinct
+    # "%m/%d/%Y" string is parsed once
+    values = np.asarray(values)
+    if values.dtype.kind == "M":
+        return values.astype("datetime64[D]")
+    if values.dtype.kind in "US" or all(isinstance(v, str) for v in values):
+        distinct, inverse = np.unique(values.astype(str), return_inverse=True)
+        ordinals = np.array([datetime.strptime(v, "%m/%d/%Y").toordinal() for v in distinct.tolist()],
+                            dtype=np.int64)
+        return (ordinals[inverse.reshape(-1)] - _EPOCH_ORDINAL).astype("datetime64[D]")
+    return np.array([to_day(v) for v in values], dtype="datetime64[D]")
+
+
+def round_cents(values):
+    """Vectorized round(x, 2) that reproduces Python's correctly rounded result.
+
+    np.round scales by 100 first, which can land on the wrong side of a tie, so
+    values sitting near a half cent fall back to the builtin round.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    scaled = values * 100.0
+    rounded = np.asarray(np.rint(scaled) / 100.0)
+    distance = np.abs(scaled - np.floor(scaled) - 0.5)
+    near_tie = distance < (np.abs(scaled) * 1e-12 + 1e-9)
+    if near_tie.any():
+        rounded[near_tie] = [round(value, 2) for value in values[near_tie].tolist()]
+    return rounded
+
+
+def period_count(settlement, maturity, period_ends, num_periods):
+    # Mirrors `while current_date < maturity_date and payment_number <= num_periods`
+    if settlement >= maturity or num_periods < 1:
+        return 0
+    return 1 + int(np.count_nonzero(period_ends[:num_periods - 1] < maturity))
+
+
+@timed("date_grid")
+def date_grid(settlement_date, maturity_date, first_payment_date, payment_frequency, num_periods, calendar=None,
+              convention=FOLLOWING):
+    """Return period start, period end and payment date arrays (datetime64[D]).
+
+    Payment dates after the first are adjusted on `calendar` (weekends only by
+    default) using `convention`.
+    """
+    settlement = to_day(settlement_date)
+    maturity = to_day(maturity_date)
+    num_periods = int(num_periods)
+    ends, in_month, payment_dates = payment_grid(to_day(first_payment_date), MONTHS_PER_PERIOD[payment_frequency],
+                                                 max(num_periods, 1), calendar, convention)
+    count = period_count(settlement, maturity, ends, num_periods)
+    # Same failure as the original loops' datetime.replace for e.g. the 31st in a 30-day month
+    if not in_month[:count].all():
+        raise ValueError("day is out of range for month")
+
+    period_ends = ends[:count].copy()
+    period_starts = np.empty(count, dtype="datetime64[D]")
+    if count:
+        period_starts[0] = settlement
+        period_starts[1:] = period_ends[:-1]
+    return period_starts, period_ends, payment_dates[:count].copy()
+
+
+@timed("date_grids")
+def date_grids(settlement, maturity, first_payment, months_increment, num_periods, calendar=None,
+               convention=FOLLOWING):
+    """Vectorized date_grid over many loans.
+
+    Inputs are 1-D arrays with one entry per loan (dates as datetime64[D]).
+    Returns (starts, ends, payment_dates, counts, bad_day): the date arrays are
+    (periods x loans), rows at or past a loan's count are padding, and bad_day
+    flags loans whose rolled payment day does not exist in some month.
+    """
+    settlement = np.asarray(settlement, dtype="datetime64[D]")
+    maturity = np.asarray(maturity, dtype="datetime64[D]")
+    first_payment = np.asarray(first_payment, dtype="datetime64[D]")
+    months_increment = np.asarray(months_increment, dtype=np.int64)
+    num_periods = np.asarray(num_periods, dtype=np.int64)
+
+    first_month = first_payment.astype("datetime64[M]")
+    first_day = (first_payment - first_month.astype("datetime64[D]")).astype(np.int64) + 1
+    grid_rows = max(int(num_periods.max(initial=0)), 1)
+    period_index = np.arange(grid_rows, dtype=np.int64)[:, None]
+    months = first_month + period_index * months_increment
+    ends = months.astype("datetime64[D]") + (first_day - 1)
+
+    rolls = (ends < maturity) & (period_index < num_periods - 1)
+    counts = 1 + np.count_nonzero(rolls, axis=0)
+    counts[(settlement >= maturity) | (num_periods < 1)] = 0
+
+    rows = int(counts.max(initial=0))
+    ends = ends[:rows]
+    in_schedule = period_index[:rows] < counts
+    bad_day = np.any((ends.astype("datetime64[M]") != months[:rows]) & in_schedule, axis=0)
+    if rows:
+        ends[0] = first_payment
+
+    starts = np.empty_like(ends)
+    if rows:
+        starts[0] = settlement
+        starts[1:] = ends[:-1]
+
+    payment_dates = ends.copy()
+    if rows > 1:
+        payment_dates[1:] = get_calendar(calendar).adjust(ends[1:], convention)
+    return starts, ends, payment_dates, counts, bad_day
+
+
+def level_payment(notional_amount, rate, days_in_first_period, basis_numerator, basis_denominator,
+                  amortization_years, periods_per_year, rounded=True):
+    # Array form of the period_payment formula in MortgageStyle.__init__, same operation order;
+    # rounded=False leaves the cent rounding to the caller
+    notional_amount = np.asarray(notional_amount, dtype=np.float64)
+    num_periods = amortization_years * periods_per_year
+    # 30, 90 and 180 days for 1M, 3M and 6M
+    standard_period_days = 360 // periods_per_year
+    k = np.maximum(days_in_first_period, standard_period_days)
+    numerator_factor = np.where(np.asarray(basis_numerator) == "ACT", 365, 360)
+    # amortization_years=0 gives nan/inf here, reported by the caller rather than warned about
+    with np.errstate(divide="ignore", invalid="ignore"):
+        frequency = num_periods / amortization_years
+        payment = ((notional_amount + notional_amount * (days_in_first_period - k) * rate / basis_denominator)
+                   * rate * numerator_factor / basis_denominator / frequency
+                   / (1 - (1 + rate * numerator_factor / basis_denominator / frequency)
+                      ** (-amortization_years * frequency)))
+    return round_cents(payment) if rounded else payment
+
+
+def basis_days(days, basis_denominator):
+    """Days to accrue over `basis_denominator`, as compute_days counts them.
+
+    A 365 denominator rescales the days to 360, so a full year accrues 360/365
+    of the rate. This is the accrual convention of the straight-line schedule,
+    its servicing and payoff, and the floating-rate engine; the fixed mortgage
+    and hybrid schedules, their servicing tail and payoff keep their own
+    unscaled actual/denominator accrual. `basis_denominator` may be one value or one per day count.
+    """
+    if np.ndim(basis_denominator) == 0:
+        return days if basis_denominator == 360 else days / 365.0 * 360.0
+    return np.where(np.asarray(basis_denominator) == 360, days, np.asarray(days) / 365.0 * 360.0)
+
+
+def accrual_days(period_starts, period_ends, basis_numerator, basis_denominator):
+    # Array form of compute_days / _compute_days
+    if basis_numerator == "ACT":
+        days = (period_ends - period_starts).astype(np.int64)
+    else:
+        days = np.full(len(period_starts), 30, dtype=np.int64)
+    return basis_days(days, basis_denominator)
+
+
+@timed("mortgage_balances")
+def mortgage_balances(notional_amount, period_payment, rate, days, basis_denominator):
+    """Run the level-payment recurrence and return (opening balances, principal).
+
+    Principal is rounded to the cent every period, so each balance depends on the
+    rounded result of the previous one. `days` may be 1-D (one loan) or 2-D
+    (periods x loans); the 2-D form steps all loans through a period at once.
+    """
+    days = np.asarray(days)
+    if days.ndim == 1:
+        count = len(days)
+        opening = np.empty(count, dtype=np.float64)
+        principal = np.empty(count, dtype=np.float64)
+        balance = notional_amount
+        for i, day_count in enumerate(days.tolist()):
+            interest_for_period = (balance * rate * day_count) / basis_denominator
+            period_principal_payment = round(period_payment - interest_for_period, 2)
+            balance -= period_principal_payment
+            opening[i] = balance + period_principal_payment
+            principal[i] = period_principal_payment
+        return opening, principal
+
+    balance = np.array(notional_amount, dtype=np.float64, copy=True)
+    opening = np.empty(days.shape, dtype=np.float64)
+    principal = np.empty(days.shape, dtype=np.float64)
+    for i in range(days.shape[0]):
+        interest_for_period = (balance * rate * days[i]) / basis_denominator
+        period_principal_payment = round_cents(period_payment - interest_for_period)
+        balance = balance - period_principal_payment
+        opening[i] = balance + period_principal_payment
+        principal[i] = period_principal_payment
+    return opening, principal
+
+
+def mortgage_style_schedule(settlement_date, maturity_date, first_payment_date, notional_amount, rate,
+                            basis_denominator, payment_frequency, num_periods, period_payment, calendar=None,
+                            convention=FOLLOWING):
+    """Array form of MortgageStyle.create_mortgage_style_amort.
+
+    `rate` is a decimal (0.0703 for 7.03%) and `period_payment` the rounded level
+    payment computed in MortgageStyle.__init__.
+    """
+    period_starts, period_ends, payment_dates = date_grid(
+        settlement_date, maturity_date, first_payment_date, payment_frequency, num_periods, calendar, convention)
+    # create_mortgage_style_amort accrues on actual days regardless of basis_numerator
+    days = (period_ends - period_starts).astype(np.int64)
+    opening, principal = mortgage_balances(notional_amount, period_payment, rate, days, basis_denominator)
+    return {
+        "period_start": period_starts,
+        "period_end": period_ends,
+        "payment_date": payment_dates,
+        "payment_number": np.arange(1, len(days) + 1, dtype=np.int64),
+        "outstanding_balance": opening,
+        "period_payment": np.full(len(days), period_payment, dtype=np.float64),
+        "principal_payment": principal,
+        "days": days,
+    }
+
+
+@timed("block_means")
+def block_means(values, counts, rows_per_block):
+    """Per-row mean of each loan's consecutive `rows_per_block`-row blocks.
+
+    `values` is (periods x loans) with counts[j] rows in use for loan j, whose
+    last block may be short; `rows_per_block` is a scalar or one per loan.
+    Loans of equal length and block size are reduced together, and each block
+    is summed as one contiguous row, the same order as Series.mean, so results
+    match it to the last bit.
+    """
+    rows, loans = values.shape
+    counts = np.broadcast_to(np.asarray(counts, dtype=np.int64), (loans,))
+    rows_per_block = np.broadcast_to(np.asarray(rows_per_block, dtype=np.int64), (loans,))
+    means = np.zeros(values.shape, dtype=np.float64)
+    by_loan = np.ascontiguousarray(values.T)
+    for block, count in set(zip(rows_per_block.tolist(), counts.tolist())):
+        if not count:
+            continue
+        members = np.flatnonzero((rows_per_block == block) & (counts == count))
+        full = count // block * block
+        segments = by_loan[members, :full].reshape(len(members), -1, block)
+        means[:full, members] = np.repeat(segments.sum(axis=2) / block, block, axis=1).T
+        if full < count:
+            tail = np.ascontiguousarray(by_loan[members, full:count])
+            means[full:count, members] = tail.sum(axis=1) / (count - full)
+    return means
+
+
+@timed("hybrid_balances")
+def hybrid_balances(notional_amount, principal, rate, days, basis_denominator):
+    """Opening balances and payments for a given principal schedule (1-D or periods x loans).
+
+    Interest accrues on the balance before each principal payment; a running
+    sum reproduces create_hybrid_style_amort's repeated subtraction exactly.
+    """
+    steps = np.empty((len(principal) + 1,) + principal.shape[1:], dtype=np.float64)
+    steps[0] = notional_amount
+    steps[1:] = -principal
+    balances = np.cumsum(steps, axis=0)
+    interest_for_period = (balances[:-1] * rate * days) / basis_denominator
+    return balances[1:] + principal, interest_for_period + principal
+
+
+def hybrid_style_schedule(settlement_date, maturity_date, first_payment_date, notional_amount, rate,
+                          basis_denominator, payment_frequency, num_periods, period_payment, calendar=None,
+                          convention=FOLLOWING):
+    """Array form of MortgageStyle.create_hybrid_style_amort.
+
+    Principal is the mortgage schedule's principal averaged over each year
+    (12, 4 or 2 periods for 1M, 3M and 6M) and rounded to the cent.
+    """
+    schedule = mortgage_style_schedule(settlement_date, maturity_date, first_payment_date, notional_amount, rate,
+                                       basis_denominator, payment_frequency, num_periods, period_payment,
+                                       calendar, convention)
+    principal = schedule["principal_payment"]
+    principal = np.round(block_means(principal[:, None], len(principal), PERIODS_PER_YEAR[payment_frequency]), 2)[:, 0]
+    opening, payment = hybrid_balances(notional_amount, principal, rate, schedule["days"], basis_denominator)
+    schedule.update(outstanding_balance=opening, period_payment=payment, principal_payment=principal)
+    return schedule
+
+
+@timed("straight_line_schedule")
+def straight_line_schedule(settlement_date, maturity_date, first_payment_date, notional_amount, rate,
+                           basis_numerator, basis_denominator, payment_frequency, num_periods, calendar=None,
+                           convention=FOLLOWING):
+    """Array form of StraightLineAmortization.generate_schedule (closed form)."""
+    period_starts, period_ends, payment_dates = date_grid(
+        settlement_date, maturity_date, first_payment_date, payment_frequency, num_periods, calendar, convention)
+    count = len(period_starts)
+    period_principal_payment = notional_amount / num_periods
+
+    # A running sum reproduces the loop's repeated subtraction bit for bit
+    steps = np.full(count + 1, -period_principal_payment, dtype=np.float64)
+    steps[0] = notional_amount
+    balances = np.cumsum(steps)
+    opening_for_interest = balances[:-1]
+    opening = balances[1:] + period_principal_payment
+
+    days = accrual_days(period_starts, period_ends, basis_numerator, basis_denominator)
+    interest_for_period = (opening_for_interest * rate * days) / basis_denominator
+    return {
+        "period_start": period_starts,
+        "period_end": period_ends,
+        "payment_date": payment_dates,
+        "payment_number": np.arange(1, count + 1, dtype=np.int64),
+        "outstanding_balance": opening,
+        "period_payment": round_cents(interest_for_period + period_principal_payment),
+        "principal_payment": np.full(count, period_principal_payment, dtype=np.float64),
+        "days": (period_ends - period_starts).astype(np.int64),
+    }
+
+
+class ScheduleIndex:
+    """Prefix sums over one loan's schedule arrays for O(log n) point and window queries.
+
+    Built once from a schedule dict (mortgage_style_schedule and friends); a
+    date is located with one binary search over the period end dates.
+    """
+
+    def __init__(self, schedule, notional_amount):
+        principal = schedule["principal_payment"]
+        self.period_end = schedule["period_end"]
+        self.notional_amount = notional_amount
+        self.closing = schedule["outstanding_balance"] - principal
+        # Interest as the app derives it: period payment less principal
+        self.cumulative_interest = np.zeros(len(principal) + 1, dtype=np.float64)
+        np.cumsum(schedule["period_payment"] - principal, out=self.cumulative_interest[1:])
+
+    def periods_through(self, date):
+        # Number of periods ending on or before `date`
+        return int(np.searchsorted(self.period_end, to_day(date), side="right"))
+
+    def last_period_end(self, date, settlement_date):
+        k = self.periods_through(date)
+        return to_day(settlement_date) if k == 0 else self.period_end[k - 1]
+
+    def balance_at(self, date):
+        k = self.periods_through(date)
+        return self.notional_amount if k == 0 else float(self.closing[k - 1])
+
+    def interest_between(self, start_date=None, end_date=None):
+        # Interest of the periods ending in [start_date, end_date]; None leaves that side open
+        lo = 0 if start_date is None else int(np.searchsorted(self.period_end, to_day(start_date), side="left"))
+        hi = len(self.period_end) if end_date is None else self.periods_through(end_date)
+        return float(self.cumulative_interest[max(hi, lo)] - self.cumulative_interest[lo])
+
+
+def format_dates(days, fmt="%m/%d/%Y"):
+    # Presentation helper: datetime64[D] -> strings, only at the DataFrame edge
+    if fmt == "%m/%d/%Y":
+        return [f"{s[5:7]}/{s[8:10]}/{s[0:4]}" for s in np.datetime_as_string(days, unit="D")]
+    return [d.strftime(fmt) for d in days.astype(object)]
+
+
+def to_python_dates(days, as_datetime=True):
+    # datetime64[D] -> datetime/date objects, matching what the original loops appended
+    if as_datetime:
+        return days.astype("datetime64[us]").astype(object)
+    return days.astype(object)
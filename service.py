@@ -0,0 +1,401 @@
+# -*- coding: utf-8 -*-
+"""
+Headless calculation service.
+
+CalculationService takes schedule requests (loan terms as a JSON-style dict,
+optionally with a floating-rate leg) and answers them without Streamlit.
+A request goes to a worker as soon as one is free; requests that arrive while
+every worker is busy queue up and leave together as one micro-batch of up to
+`max_batch` loans. A batch is amortized with one amortize_portfolio call (and
+apply_floating_rate_portfolio for floating loans) in a process pool, so the
+event loop never does CPU work. Forward curves are parsed once at start-up and
+stay loaded in every worker.
+
+serve() puts a small HTTP/1.1 JSON front end on a service:
+
+    POST /schedule   one request object, or a list of them
+    GET  /stats      batch sizes and latency percentiles
+    GET  /health
+
+    python service.py --sofr SOFR_Data.xls --port 8080
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from functools import partial
+
+import numpy as np
+
+from business_calendar import CALENDARS, CONVENTIONS, FOLLOWING
+from floating_rate import apply_floating_rate_portfolio, check_bounds
+from forward_curve import METHODS
+from money import FLOAT, MONEY_MODES
+from portfolio import FRAME_COLUMNS, LOAN_TERMS, MONEY_FIELDS, STYLES, amortize_portfolio
+from schedule_engine import MONTHS_PER_PERIOD, PERIODS_PER_YEAR
+
+
+DATE_TERMS = ("settlement_date", "maturity_date", "first_payment_date")
+SCHEDULE_COLUMNS = ("payment_number", "period_start", "period_end", "payment_date", "outstanding_balance",
+                    "period_payment", "principal_payment", "days")
+
+
+def load_sofr_curves(path):
+    """{(tenor, method): ForwardCurve} for the 1M and 3M sheets of a SOFR workbook, under every method."""
+    from SOFRDataExtractor import SOFRDataExtractor
+
+    extractor = SOFRDataExtractor(path)
+    return {(tenor, method): extractor.forward_curve(data, method)
+            for tenor, data in (("1M", extractor.data_1m), ("3M", extractor.data_3m)) for method in METHODS}
+
+
+def _date(value):
+    # ISO dates from JSON clients; anything else ("%m/%d/%Y", date objects) as the loan classes take it
+    if isinstance(value, str) and len(value) == 10 and value[4] == "-":
+        return date.fromisoformat(value)
+    return value
+
+
+def parse_request(payload, curves=None):
+    """Validate one request dict and return it normalized; raises ValueError on bad input.
+
+    Needs the LOAN_TERMS fields (style defaults to Mortgage Style; rate in
+    percent). Optional: id, calendar, business_day_convention, money (float
+    by default, matching the single-loan classes) and floating, a dict with
+    curve ("1M"/"3M"), method, spread, reset_frequency, lookback_days, cap and
+    floor (decimals, as for apply_floating_rate).
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("A request must be a JSON object")
+    request = dict(payload)
+    request.setdefault("style", STYLES[0])
+    missing = [term for term in LOAN_TERMS if term not in request]
+    if missing:
+        raise ValueError(f"Request is missing fields: {', '.join(missing)}")
+    for term in DATE_TERMS:
+        request[term] = _date(request[term])
+    if request["style"] not in STYLES:
+        raise ValueError(f"Unknown amortization style: {request['style']}")
+    if request["payment_frequency"] not in PERIODS_PER_YEAR:
+        raise ValueError(f"Unknown payment frequency: {request['payment_frequency']}")
+    request.setdefault("calendar", None)
+    if request["calendar"] is not None and request["calendar"] not in CALENDARS:
+        raise ValueError(f"Unknown calendar: {request['calendar']}")
+    request.setdefault("business_day_convention", FOLLOWING)
+    if request["business_day_convention"] not in CONVENTIONS:
+        raise ValueError(f"Unknown business day convention: {request['business_day_convention']}")
+    request.setdefault("money", FLOAT)
+    if request["money"] not in MONEY_MODES:
+        raise ValueError(f"Unknown money mode: {request['money']}")
+
+    floating = request.get("floating")
+    if floating is not None:
+        floating = dict({"method": "linear", "spread": 0.0, "lookback_days": 0, "cap": None, "floor": None},
+                        **floating)
+        floating.setdefault("reset_frequency", floating.get("curve", "1M"))
+        if floating.get("curve") is None:
+            raise ValueError("A floating request needs a curve")
+        if curves is not None and (floating["curve"], floating["method"]) not in curves:
+            raise ValueError(f"Unknown curve: {floating['curve']} ({floating['method']})")
+        if floating["reset_frequency"] not in MONTHS_PER_PERIOD:
+            raise ValueError(f"Unknown reset frequency: {floating['reset_frequency']}")
+        check_bounds(floating["cap"], floating["floor"])
+        request["floating"] = floating
+    return request
+
+
+def _batch_key(request):
+    # Requests that can share one amortize_portfolio (and floating-rate) call
+    floating = request.get("floating")
+    leg = None if floating is None else (floating["curve"], floating["method"], floating["reset_frequency"])
+    return request["money"], request["calendar"], request["business_day_convention"], leg
+
+
+def _bound(values, missing):
+    # Per-loan cap or floor; loans without one get an infinite bound so np.clip leaves them alone
+    if all(value is None for value in values):
+        return None
+    return np.array([missing if value is None else value for value in values], dtype=np.float64)
+
+
+def _calculate_group(requests, curves):
+    money, calendar, convention, leg = _batch_key(requests[0])
+    table = {term: [request[term] for request in requests] for term in LOAN_TERMS}
+    # Errors name loans by request id, also when a failed group is retried one request at a time
+    table["loan_id"] = np.empty(len(requests), dtype=object)
+    for i, request in enumerate(requests):
+        table["loan_id"][i] = request.get("id")
+    schedule = amortize_portfolio(table, calendar=calendar, convention=convention, money=money)
+
+    # Whole columns converted to Python values once, then sliced per loan
+    columns = {}
+    for field in SCHEDULE_COLUMNS:
+        values = schedule.amounts(field) if field in MONEY_FIELDS else schedule[field]
+        if values.dtype.kind == "M":
+            values = np.datetime_as_string(values)
+        columns[FRAME_COLUMNS[field]] = values.tolist()
+    if leg is not None:
+        curve_name, method, reset_frequency = leg
+        legs = [request["floating"] for request in requests]
+        result = apply_floating_rate_portfolio(
+            schedule, curves[(curve_name, method)], spread=[item["spread"] for item in legs],
+            reset_frequency=reset_frequency, basis_numerator=table["basis_numerator"],
+            basis_denominator=table["basis_denominator"], lookback_days=[item["lookback_days"] for item in legs],
+            cap=_bound([item["cap"] for item in legs], np.inf), floor=_bound([item["floor"] for item in legs], -np.inf))
+        # Same columns apply_floating_rate adds to a single-loan schedule
+        columns["Period Interest"] = result["interest"].tolist()
+        columns["Period Payment"] = result["payment"].tolist()
+        columns["Interest Rate (%)"] = np.round(result["rate"] * 100, 2).tolist()
+
+    offsets = schedule.offsets.tolist()
+    return [{"id": request.get("id"),
+             "schedule": {name: values[offsets[i]:offsets[i + 1]] for name, values in columns.items()}}
+            for i, request in enumerate(requests)]
+
+
+def calculate_batch(requests, curves=None):
+    """Results for a list of parsed requests, in order; a failing request gives {"id", "error"}."""
+    groups = {}
+    for i, request in enumerate(requests):
+        groups.setdefault(_batch_key(request), []).append(i)
+    results = [None] * len(requests)
+    for members in groups.values():
+        try:
+            for i, result in zip(members, _calculate_group([requests[i] for i in members], curves)):
+                results[i] = result
+        except Exception:
+            # One bad loan must not fail the batch: redo the group a loan at a time
+            for i in members:
+                try:
+                    results[i] = _calculate_group([requests[i]], curves)[0]
+                except Exception as exc:
+                    results[i] = {"id": requests[i].get("id"), "error": str(exc)}
+    return results
+
+
+_worker_curves = None
+
+
+def _init_worker(curves):
+    # Runs once per pool process, so curves are shipped to each worker only at start-up
+    global _worker_curves
+    _worker_curves = curves
+
+
+def _calculate_in_worker(requests):
+    return calculate_batch(requests, _worker_curves)
+
+
+class CalculationService:
+    """Micro-batching front end over calculate_batch.
+
+    `workers` processes do the calculations (os.cpu_count() by default);
+    workers=0 runs batches on a thread in this process instead. A batch
+    leaves when a worker is free, with whatever is queued (up to
+    `max_batch`); `max_delay` seconds of extra waiting for a fuller batch
+    trade latency for throughput and are off by default.
+    """
+
+    def __init__(self, curves=None, workers=None, max_batch=64, max_delay=0.0):
+        self.curves = curves or {}
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.batches = 0
+        self.requests = 0
+        self.latencies = deque(maxlen=10000)
+        self._queue = None
+        self._executor = None
+        self._batcher = None
+        self._slots = None
+        self._in_flight = set()
+
+    async def start(self):
+        if self.workers:
+            self._executor = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(self.curves,))
+            # Start every worker now rather than on the first requests
+            await asyncio.gather(*(asyncio.get_running_loop().run_in_executor(self._executor, _calculate_in_worker, [])
+                                   for _ in range(self.workers)))
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(max(self.workers, 1))
+        self._batcher = asyncio.create_task(self._collect())
+        return self
+
+    async def close(self):
+        if self._batcher is not None:
+            self._batcher.cancel()
+            await asyncio.gather(self._batcher, return_exceptions=True)
+            self._batcher = None
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def calculate(self, payload):
+        """Schedule for one request dict; raises ValueError if the request is invalid."""
+        request = parse_request(payload, self.curves)
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((request, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            # While every worker is busy, new requests pile up in the queue and join this batch
+            await self._slots.acquire()
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            task = asyncio.create_task(self._run(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _run(self, batch):
+        requests = [request for request, _, _ in batch]
+        loop = asyncio.get_running_loop()
+        try:
+            if self._executor is not None:
+                results = await loop.run_in_executor(self._executor, _calculate_in_worker, requests)
+            else:
+                results = await loop.run_in_executor(None, partial(calculate_batch, requests, self.curves))
+        except Exception as exc:
+            results = [{"id": request.get("id"), "error": str(exc)} for request in requests]
+        finally:
+            self._slots.release()
+        done = time.perf_counter()
+        self.batches += 1
+        self.requests += len(batch)
+        for (_, future, received), result in zip(batch, results):
+            self.latencies.append(done - received)
+            if not future.done():
+                future.set_result(result)
+
+    def reset_stats(self):
+        self.batches = self.requests = 0
+        self.latencies.clear()
+
+    def stats(self):
+        latencies = np.array(self.latencies) * 1000
+        percentiles = np.percentile(latencies, [50, 90, 99]).tolist() if len(latencies) else [None] * 3
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch": self.requests / self.batches if self.batches else 0.0,
+            "p50_ms": percentiles[0],
+            "p90_ms": percentiles[1],
+            "p99_ms": percentiles[2],
+        }
+
+
+def _response(status, body, keep_alive):
+    payload = json.dumps(body, default=str).encode()
+    reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}[status]
+    head = (f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode() + payload
+
+
+async def _handle(service, method, path, body):
+    if path == "/health":
+        return 200, {"status": "ok"}
+    if path == "/stats":
+        return 200, service.stats()
+    if path != "/schedule":
+        return 404, {"error": f"Unknown path: {path}"}
+    if method != "POST":
+        return 405, {"error": "Use POST"}
+    try:
+        payload = json.loads(body or b"null")
+    except ValueError as exc:
+        return 400, {"error": f"Invalid JSON: {exc}"}
+    if isinstance(payload, list):
+        results = await asyncio.gather(*(service.calculate(item) for item in payload), return_exceptions=True)
+        return 200, [{"error": str(result)} if isinstance(result, Exception) else result for result in results]
+    try:
+        result = await service.calculate(payload)
+    except ValueError as exc:
+        return 400, {"error": str(exc)}
+    return (400 if "error" in result else 200), result
+
+
+async def _connection(service, reader, writer):
+    # Minimal HTTP/1.1: one request at a time per connection, kept alive unless the client closes it
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            method, path, version = request_line.decode("latin-1").split()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+            keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+            status, result = await _handle(service, method, path.split("?")[0], body)
+            writer.write(_response(status, result, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(service, host="127.0.0.1", port=8080):
+    """Run the HTTP front end for a started `service` until cancelled."""
+    server = await asyncio.start_server(partial(_connection, service), host, port)
+    async with server:
+        await server.serve_forever()
+
+
+async def _main(args):
+    curves = load_sofr_curves(args.sofr) if args.sofr else {}
+    async with CalculationService(curves, args.workers, args.max_batch, args.max_delay_ms / 1000) as service:
+        print(f"Serving on http://{args.host}:{args.port} ({service.workers} workers, {len(curves)} curves)")
+        await serve(service, args.host, args.port)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--sofr", help="SOFR workbook to load the 1M and 3M forward curves from")
+    parser.add_argument("--workers", type=int, help="worker processes (default: CPU count; 0 = in-process thread)")
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--max-delay-ms", type=float, default=0.0, help="extra wait for fuller batches")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(_main(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
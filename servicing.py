@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental re-amortization for servicing events.
+
+A prepayment, rate change or re-amortization only changes a schedule from the
+period it lands in. apply_mortgage_events and apply_straight_line_events keep
+every earlier row of an existing schedule DataFrame as is and recompute only
+the tail, from that period's opening balance, reusing the schedule's own dates
+and day counts. A tail that pays the loan off early is cut at the payoff
+period. Straight-line tails accrue as compute_days (see basis_days); mortgage
+tails keep create_mortgage_style_amort's unscaled actual/denominator accrual,
+so that rows an event does not touch come out unchanged.
+"""
+
+from bisect import bisect_left
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import count, timed
+from schedule_engine import PERIODS_PER_YEAR, basis_days, round_cents, to_day
+
+
+class Prepayment:
+    """Extra principal paid with the first payment on or after `date`.
+
+    By default the level payment is kept and the loan pays off sooner; with
+    `reamortize` the payment is recomputed over the remaining periods.
+    """
+
+    __slots__ = ("date", "amount", "reamortize")
+
+    def __init__(self, date, amount, reamortize=False):
+        self.date = date
+        self.amount = amount
+        self.reamortize = reamortize
+
+
+class RateChange:
+    """New rate (in percent) for the periods starting on or after `date`."""
+
+    __slots__ = ("date", "rate", "reamortize")
+
+    def __init__(self, date, rate, reamortize=True):
+        self.date = date
+        self.rate = rate
+        self.reamortize = reamortize
+
+
+class Reamortization:
+    """Recompute the level payment (or principal) over the periods starting on or after `date`."""
+
+    __slots__ = ("date",)
+
+    def __init__(self, date):
+        self.date = date
+
+
+def annuity_payment(balance, rate, basis_numerator, basis_denominator, periods_per_year, periods):
+    # The per-period rate MortgageStyle.__init__ uses, without its first-period adjustment
+    if periods <= 0:
+        return round(balance, 2)
+    period_rate = rate * (365 if basis_numerator == "ACT" else 360) / basis_denominator / periods_per_year
+    if period_rate == 0:
+        return round(balance / periods, 2)
+    return round(balance * period_rate / (1 - (1 + period_rate) ** -periods), 2)
+
+
+def mortgage_tail(balance, period_payment, rate, days, basis_denominator, prepayment=0.0):
+    """Level-payment rows from `balance`: (opening, payment, principal) arrays.
+
+    Same arithmetic as create_mortgage_style_amort; `prepayment` is added to
+    the first row, and the rows stop at the period that pays the loan off.
+    """
+    opening, payment, principal = [], [], []
+    last = len(days) - 1
+    for i, day_count in enumerate(np.asarray(days).tolist()):
+        interest_for_period = (balance * rate * day_count) / basis_denominator
+        period_principal_payment = round(period_payment - interest_for_period, 2)
+        paid = period_payment
+        if i == 0 and prepayment:
+            period_principal_payment += prepayment
+            paid += prepayment
+        if period_principal_payment >= balance and (i < last or prepayment):
+            opening.append(balance)
+            payment.append(round(interest_for_period + balance, 2))
+            principal.append(balance)
+            break
+        balance -= period_principal_payment
+        opening.append(balance + period_principal_payment)
+        payment.append(paid)
+        principal.append(period_principal_payment)
+    return np.array(opening), np.array(payment), np.array(principal)
+
+
+def straight_line_tail(balance, period_principal_payment, rate, accrual, basis_denominator, prepayment=0.0):
+    """Straight-line rows from `balance`: (opening, payment, principal) arrays, cut at payoff."""
+    principal = np.full(len(accrual), period_principal_payment, dtype=np.float64)
+    if len(principal):
+        principal[0] += prepayment
+    steps = np.concatenate(([balance], -principal))
+    balances = np.cumsum(steps)
+    opening = balances[:-1]
+    paid_off = np.flatnonzero(balances[1:] <= 0)
+    if len(paid_off) and (paid_off[0] < len(principal) - 1 or prepayment):
+        end = paid_off[0] + 1
+        opening, principal, accrual = opening[:end], principal[:end], accrual[:end]
+        principal[-1] = opening[-1]
+    interest_for_period = (opening * rate * accrual) / basis_denominator
+    return opening, round_cents(interest_for_period + principal), principal
+
+
+def _event_row(schedule, event):
+    # Prepayments land in the period ending on or after their date, other events in the first period starting then
+    column = "Period End Date" if isinstance(event, Prepayment) else "Period Start Date"
+    # Binary search parsing only the dates it probes, not the whole column
+    row = bisect_left(schedule[column].to_numpy(), to_day(event.date), key=to_day)
+    if row >= len(schedule):
+        raise ValueError(f"{type(event).__name__} on {event.date} falls after the last period")
+    return row
+
+
+def _splice(schedule, row, opening, payment, principal):
+    # Column-wise: the prefix is kept as is, the tail takes the schedule's dates and the new amounts
+    end = row + len(opening)
+    replaced = {"Outstanding Balance": opening, "Period Payment": payment, "Principal Payment": principal}
+    columns = {}
+    for name in schedule.columns:
+        values = schedule[name].to_numpy()
+        columns[name] = np.concatenate((values[:row], replaced[name])) if name in replaced else values[:end]
+    return pd.DataFrame(columns)
+
+
+def _sorted(events):
+    count("servicing_events", len(events))
+    return sorted(events, key=lambda event: to_day(event.date))
+
+
+@timed("servicing_events")
+def apply_mortgage_events(schedule, events, rate, basis_numerator, basis_denominator, payment_frequency,
+                          num_periods):
+    """Apply `events` in date order to a create_mortgage_style_amort DataFrame; returns a new DataFrame.
+
+    `rate` is the loan's current rate as a decimal. Re-amortizing spreads the
+    balance over what is left of the `num_periods` amortization term, which
+    may run past the schedule's maturity.
+    """
+    periods_per_year = PERIODS_PER_YEAR[payment_frequency]
+    for event in _sorted(events):
+        row = _event_row(schedule, event)
+        balance = float(schedule["Outstanding Balance"].iloc[row])
+        period_payment = float(schedule["Period Payment"].iloc[row])
+        days = schedule["Days in Period"].to_numpy()[row:]
+        if isinstance(event, RateChange):
+            rate = event.rate / 100
+        if isinstance(event, Prepayment):
+            opening, payment, principal = mortgage_tail(balance, period_payment, rate, days[:1], basis_denominator,
+                                                        event.amount)
+            remaining = opening[0] - principal[0]
+            if len(days) > 1 and remaining > 0:
+                if event.reamortize:
+                    period_payment = annuity_payment(remaining, rate, basis_numerator, basis_denominator,
+                                                     periods_per_year, num_periods - row - 1)
+                rest = mortgage_tail(remaining, period_payment, rate, days[1:], basis_denominator)
+                opening, payment, principal = (np.concatenate(pair) for pair in
+                                               zip((opening, payment, principal), rest))
+        else:
+            if isinstance(event, Reamortization) or event.reamortize:
+                period_payment = annuity_payment(balance, rate, basis_numerator, basis_denominator,
+                                                 periods_per_year, num_periods - row)
+            opening, payment, principal = mortgage_tail(balance, period_payment, rate, days, basis_denominator)
+        schedule = _splice(schedule, row, opening, payment, principal)
+    return schedule
+
+
+@timed("servicing_events")
+def apply_straight_line_events(schedule, events, rate, basis_numerator, basis_denominator, num_periods):
+    """Apply `events` in date order to a generate_schedule DataFrame; returns a new DataFrame.
+
+    Re-amortizing spreads the balance left after any prepayment evenly over
+    what is left of the `num_periods` term; otherwise the level principal is
+    kept.
+    """
+    for event in _sorted(events):
+        row = _event_row(schedule, event)
+        balance = float(schedule["Outstanding Balance"].iloc[row])
+        period_principal_payment = float(schedule["Principal Payment"].iloc[row])
+        days = schedule["Actual Days in Period"].to_numpy()[row:]
+        # Accrual as compute_days: a flat 30 on the "30" basis, rescaled for a 365 denominator
+        accrual = basis_days(days if basis_numerator == "ACT" else np.full(len(days), 30), basis_denominator)
+        if isinstance(event, RateChange):
+            rate = event.rate / 100
+        prepayment = event.amount if isinstance(event, Prepayment) else 0.0
+        if isinstance(event, Reamortization) or event.reamortize:
+            period_principal_payment = (balance - prepayment) / (num_periods - row)
+        opening, payment, principal = straight_line_tail(balance, period_principal_payment, rate, accrual,
+                                                         basis_denominator, prepayment)
+        schedule = _splice(schedule, row, opening, payment, principal)
+    return schedule
@@ -7,10 +7,19 @@ Created on Wed Sep  6 11:55:47 2023
 
 
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime
+from business_calendar import FOLLOWING, get_calendar
+from instrumentation import count, stage
+from servicing import apply_straight_line_events
+from schedule_engine import ScheduleIndex, basis_days, straight_line_schedule, to_day, to_python_dates
 
 class StraightLineAmortization:
-    def __init__(self, settlement_date, maturity_date, first_payment_date, notional_amount, rate, basis_numerator, basis_denominator, amortization_years, payment_frequency):
+    # Terms live in slots rather than a per-instance __dict__
+    __slots__ = ("settlement_date", "maturity_date", "first_payment_date", "notional_amount", "rate",
+                 "basis_numerator", "basis_denominator", "amortization_years", "payment_frequency", "calendar",
+                 "business_day_convention", "num_periods", "period_principal_payment", "_query_index")
+
+    def __init__(self, settlement_date, maturity_date, first_payment_date, notional_amount, rate, basis_numerator, basis_denominator, amortization_years, payment_frequency, calendar=None, business_day_convention=FOLLOWING):
         self.settlement_date = datetime.strptime(settlement_date, "%m/%d/%Y") if isinstance(settlement_date, str) else settlement_date
         self.maturity_date = datetime.strptime(maturity_date, "%m/%d/%Y") if isinstance(maturity_date, str) else maturity_date
         self.first_payment_date = datetime.strptime(first_payment_date, "%m/%d/%Y") if isinstance(first_payment_date, str) else first_payment_date
@@ -21,6 +30,9 @@ class StraightLineAmortization:
         self.amortization_years = amortization_years
         # Add the payment_frequency variable
         self.payment_frequency = payment_frequency
+        self.calendar = get_calendar(calendar)
+        self.business_day_convention = business_day_convention
+        self._query_index = None
         # Adjust the num_periods and monthly_principal_payment based on payment_frequency
         if self.payment_frequency == "1M":
             self.num_periods = self.amortization_years * 12
@@ -40,54 +52,76 @@ class StraightLineAmortization:
         else:
             return days / 365.0 * 360.0
 
-    def get_next_dates(self, current_date):
-        if current_date == self.settlement_date:
-            return self.first_payment_date, self.first_payment_date
+    def generate_schedule(self):
+        schedule = straight_line_schedule(self.settlement_date, self.maturity_date, self.first_payment_date,
+                                          self.notional_amount, self.rate, self.basis_numerator,
+                                          self.basis_denominator, self.payment_frequency, self.num_periods,
+                                          self.calendar, self.business_day_convention)
 
-        # Calculate next_month and next_year based on payment_frequency
-        if self.payment_frequency == "1M":
-            months_increment = 1
-        elif self.payment_frequency == "3M":
-            months_increment = 3
-        elif self.payment_frequency == "6M":
-            months_increment = 6
-        
-        next_month = (current_date.month + months_increment - 1) % 12 + 1
-        next_year = current_date.year + (current_date.month - 1 + months_increment) // 12
+        count("schedules")
+        count("schedule_periods", len(schedule["days"]))
+        # Keep the date type the caller passed in (datetime for strings, date for st.date_input)
+        as_datetime = isinstance(self.first_payment_date, datetime)
+        with stage("schedule_frame"):
+            df = pd.DataFrame({
+                'Period Start Date': to_python_dates(schedule["period_start"], as_datetime),
+                'Period End Date': to_python_dates(schedule["period_end"], as_datetime),
+                'Payment Date': to_python_dates(schedule["payment_date"], as_datetime),
+                'Payment Number': schedule["payment_number"],
+                'Outstanding Balance': schedule["outstanding_balance"],
+                'Period Payment': schedule["period_payment"],
+                'Principal Payment': schedule["principal_payment"],
+                'Actual Days in Period': schedule["days"],
+            })
+        return df
 
-        period_end_date = current_date.replace(year=next_year, month=next_month, day=self.first_payment_date.day)
+    def _index(self):
+        if self._query_index is None:
+            schedule = straight_line_schedule(self.settlement_date, self.maturity_date, self.first_payment_date,
+                                              self.notional_amount, self.rate, self.basis_numerator,
+                                              self.basis_denominator, self.payment_frequency, self.num_periods,
+                                              self.calendar, self.business_day_convention)
+            self._query_index = ScheduleIndex(schedule, self.notional_amount)
+        return self._query_index
 
-        payment_date = period_end_date
-        # If it's a weekend, move to the next business day for payment date
-        while payment_date.weekday() >= 5:
-            payment_date += timedelta(days=1)
+    def level_payment(self):
+        # Principal is the level amount here; interest runs off with the balance
+        return self.period_principal_payment
 
-        return period_end_date, payment_date
+    def balance_at(self, date):
+        """Outstanding balance after every payment whose period ends on or before `date`."""
+        # Arithmetic series: k equal principal payments
+        return self.notional_amount - self._index().periods_through(date) * self.period_principal_payment
 
-    def generate_schedule(self):
-        data = []
-        current_date = self.settlement_date
-        payment_number = 1
-        notional_amount = self.notional_amount
-        
-        while current_date < self.maturity_date and payment_number <= self.num_periods:
-            period_start_date = current_date
-            period_end_date, payment_date = self.get_next_dates(current_date)
-            days_in_period = self.compute_days(period_start_date, period_end_date)
-            actual_days_in_period = (period_end_date - period_start_date).days
-            interest_for_period = (notional_amount * self.rate * days_in_period) / self.basis_denominator
-            period_payment = round(interest_for_period + self.period_principal_payment,2)
-            notional_amount -= self.period_principal_payment
+    def cumulative_interest(self, start_date=None, end_date=None):
+        """Total interest of the periods ending between start_date and end_date (inclusive)."""
+        return self._index().interest_between(start_date, end_date)
 
-            data.append([period_start_date, period_end_date, payment_date, payment_number, notional_amount + self.period_principal_payment, period_payment, self.period_principal_payment, actual_days_in_period])
+    def payoff_amount(self, date):
+        """Balance at `date` plus the current period's scheduled interest, pro-rated by elapsed days."""
+        index = self._index()
+        balance = self.balance_at(date)
+        k = index.periods_through(date)
+        if k == len(index.period_end):
+            return round(balance, 2)
+        start = index.last_period_end(date, self.settlement_date)
+        period_days = int((index.period_end[k] - start).astype(int))
+        elapsed = int((to_day(date) - start).astype(int))
+        # The period accrues as compute_days counts it (a flat 30 on the "30" basis), spread over its actual days
+        days = basis_days(period_days if self.basis_numerator == "ACT" else 30, self.basis_denominator)
+        days = days * elapsed / period_days
+        return round(balance + (balance * self.rate * days) / self.basis_denominator, 2)
 
-            current_date = period_end_date # Start next period the same day as the previous period's end date
-            payment_number += 1
+    def apply_events(self, schedule, *events):
+        """Apply Prepayment, RateChange or Reamortization events to a generate_schedule DataFrame.
 
-        df = pd.DataFrame(data, columns=['Period Start Date', 'Period End Date', 'Payment Date', 'Payment Number', 'Outstanding Balance', 'Period Payment', 'Principal Payment', 'Actual Days in Period'])
-        return df
+        Rows before the first event are reused; only the tail is recomputed.
+        """
+        return apply_straight_line_events(schedule, events, self.rate, self.basis_numerator, self.basis_denominator,
+                                          self.num_periods)
 
 # Usage
-sla = StraightLineAmortization("8/1/2022", "8/1/2032", "9/1/2022", 600000, 7.03, "ACT", 360, 25, "3M")
-amortization_schedule = sla.generate_schedule()
-print(amortization_schedule)
\ No newline at end of file
+if __name__ == "__main__":
+    sla = StraightLineAmortization("8/1/2022", "8/1/2032", "9/1/2022", 600000, 7.03, "ACT", 360, 25, "3M")
+    amortization_schedule = sla.generate_schedule()
+    print(amortization_schedule)
\ No newline at end of file